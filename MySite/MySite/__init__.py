@@ -1,3 +1,10 @@
-from .celery import app as celery_app
+def __getattr__(name):
+    # Celery is imported on first use, so web workers and management
+    # commands that never enqueue tasks start without it.
+    if name == 'celery_app':
+        from .celery import app
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-__all__ = ('celery_app',)
\ No newline at end of file
+
+__all__ = ('celery_app',)
@@ -4,4 +4,5 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MySite.settings')
 
+# Serves the async live update streams, which would tie up a worker thread each under WSGI.
 application = get_asgi_application()
@@ -0,0 +1,157 @@
+import copy
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connections
+from django.dispatch import receiver
+from django.http import QueryDict
+from django.urls import NoReverseMatch, resolve, reverse
+from rest_framework import serializers, status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger('django')
+
+# Read-only endpoints only: sub-requests run concurrently and must not change state.
+BATCH_URL_NAMES = [
+    'api-product-list-create',
+    'api-product-detail',
+    'api-product-comments',
+    'api-product-recommendations',
+    'api-similar-products',
+    'api-author-products',
+    'api-author-stats',
+    'api-cart-view',
+    'api-profile',
+    'api-availability',
+]
+
+# Conditional headers describe the batch request, not its sub-requests.
+DROPPED_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'CONTENT_TYPE', 'CONTENT_LENGTH')
+
+
+class SubRequestSerializer(serializers.Serializer):
+    name = serializers.ChoiceField(choices=BATCH_URL_NAMES)
+    kwargs = serializers.DictField(child=serializers.CharField(), required=False, default=dict)
+    query = serializers.DictField(child=serializers.CharField(), required=False, default=dict)
+
+    def validate(self, attrs):
+        try:
+            attrs['path'] = reverse(attrs['name'], kwargs=attrs['kwargs'])
+        except NoReverseMatch:
+            raise serializers.ValidationError({'kwargs': 'The parameters do not match the URL.'})
+        return attrs
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'At most {settings.BATCH_MAX_REQUESTS} requests are allowed.')
+        return value
+
+
+def build_subrequest(request, path, query):
+    """Return a GET request for the path that reuses the batch request's authentication."""
+    subrequest = copy.copy(request._request)
+    subrequest.__dict__.pop('headers', None)
+    query_string = urlencode(query)
+    subrequest.method = 'GET'
+    subrequest.path = subrequest.path_info = path
+    subrequest.GET = QueryDict(query_string)
+    subrequest.META = {
+        **{key: value for key, value in request.META.items() if key not in DROPPED_HEADERS},
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+    }
+    if request.user.is_authenticated:
+        # Picked up by DRF's Request, so the token is not looked up again.
+        subrequest._force_auth_user = request.user
+        subrequest._force_auth_token = request.auth
+    return subrequest
+
+
+def execute_subrequest(subrequest):
+    """Run the view of a sub-request and return its status and data."""
+    match = resolve(subrequest.path_info)
+    subrequest.resolver_match = match
+    try:
+        response = match.func(subrequest, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception(f'Batch sub-request to {subrequest.path} failed')
+        return {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'body': {'detail': 'Internal server error.'}}
+    return {'status': response.status_code, 'body': getattr(response, 'data', None)}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide pool of BATCH_MAX_WORKERS threads that run sub-requests."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS, thread_name_prefix='batch')
+    return _executor
+
+
+@receiver(setting_changed)
+def reset_executor(setting, **kwargs):
+    """Shut down the pool when its size is overridden."""
+    global _executor
+    if setting == 'BATCH_MAX_WORKERS' and _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def execute_in_thread(subrequest):
+    # Like request threads, pool threads keep their connections for up to CONN_MAX_AGE.
+    close_old_connections()
+    try:
+        return execute_subrequest(subrequest)
+    finally:
+        close_old_connections()
+
+
+def execute_batch(subrequests):
+    """Run the sub-requests, concurrently when no transaction is open.
+
+    Worker threads use their own database connections, so inside a
+    transaction they would not see its uncommitted rows. The threads are
+    shared by all batches of the process, so batches never open more than
+    BATCH_MAX_WORKERS extra connections.
+    """
+    workers = min(settings.BATCH_MAX_WORKERS, len(subrequests))
+    in_transaction = any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+    if workers < 2 or in_transaction:
+        return [execute_subrequest(subrequest) for subrequest in subrequests]
+    return list(get_executor().map(execute_in_thread, subrequests))
+
+
+class BatchView(APIView):
+    """Run several GET requests to the shop and account APIs in one round-trip.
+
+    The batch request is authenticated once, and its user is passed on to
+    every sub-request. Each sub-view still checks its own permissions and
+    throttles.
+    """
+
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+        results = execute_batch([build_subrequest(request, item['path'], item['query']) for item in items])
+        return Response({
+            'responses': [{'name': item['name'], **result} for item, result in zip(items, results)]
+        })
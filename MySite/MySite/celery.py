@@ -1,8 +1,17 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MySite.settings')
 
 app = Celery('MySite')
 app.config_from_object('django.conf:settings', namespace='CELERY')
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@app.on_after_configure.connect
+def build_crontab_schedules(sender, **kwargs):
+    """Turn beat schedules written as crontab fields in settings into crontab schedules."""
+    for entry in sender.conf.beat_schedule.values():
+        if isinstance(entry['schedule'], dict):
+            entry['schedule'] = crontab(**entry['schedule'])
@@ -0,0 +1,148 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.utils.module_loading import import_string
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        status_code = getattr(record, 'status_code', None)
+        if status_code is not None:
+            data['status_code'] = status_code
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a share of records below WARNING for high-volume loggers.
+
+    ``rates`` maps logger names to the share of records to keep; child
+    loggers inherit the rate of their closest configured parent.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Hand records to a bounded queue drained by a background listener.
+
+    The request thread only formats the message and enqueues it. When the
+    queue is full, the record is dropped and counted instead of blocking,
+    and the number of dropped records is logged once the queue has room.
+    """
+
+    def __init__(self, targets, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.targets = [self._build_target(spec) for spec in targets]
+        self.dropped = Counter()
+        self._unreported = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+        self.start()
+        atexit.register(self.stop)
+
+    @staticmethod
+    def _build_target(spec):
+        spec = dict(spec)
+        handler = import_string(spec.pop('class'))(**spec)
+        handler.setFormatter(JsonFormatter())
+        return handler
+
+    def start(self):
+        """Start the listener thread for the current process."""
+        self._listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self._listener.start()
+        self._pid = os.getpid()
+
+    def stop(self):
+        """Flush queued records and stop the listener thread."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.request = None
+        return record
+
+    def enqueue(self, record):
+        if self._unreported:
+            self._report_dropped()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped[record.name] += 1
+                self._unreported += 1
+
+    def _report_dropped(self):
+        with self._lock:
+            count, self._unreported = self._unreported, 0
+        if not count:
+            return
+        report = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            'Log queue was full, dropped %d records', (count,), None,
+        )
+        try:
+            self.queue.put_nowait(self.prepare(report))
+        except queue.Full:
+            with self._lock:
+                self._unreported += count
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            # The listener thread does not survive fork, so start a new one in the child.
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.start()
+        super().emit(record)
+
+    def close(self):
+        self.stop()
+        for target in self.targets:
+            target.close()
+        super().close()
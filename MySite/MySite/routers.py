@@ -0,0 +1,57 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from account.backends import get_key_store
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def start_replica_reads():
+    """Send reads in the current context to replicas and return a reset token."""
+    return _read_from_replica.set(True)
+
+
+def stop_replica_reads(token):
+    """Return reads in the current context to the primary."""
+    _read_from_replica.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """Context manager sending the reads inside it to replicas."""
+    token = start_replica_reads()
+    try:
+        yield
+    finally:
+        stop_replica_reads(token)
+
+
+def mark_recent_write(user):
+    """Pin the user's reads to the primary for the read-your-writes window."""
+    get_key_store().setex(f'db:recent-write:{user.pk}', settings.REPLICA_READ_YOUR_WRITES_SECONDS, 1)
+
+
+def has_recent_write(user):
+    """Return True if the user wrote within the read-your-writes window."""
+    return bool(get_key_store().exists(f'db:recent-write:{user.pk}'))
+
+
+class ReplicaRouter:
+    """Route reads to a random replica inside replica_reads() and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
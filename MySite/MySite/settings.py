@@ -1,38 +1,38 @@
 from datetime import timedelta
 from pathlib import Path
-from decouple import config
+
+from decouple import Csv, config
 
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Logger settings
+# Records are written as JSON by a background listener, so the request path never waits on log I/O
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
+    'filters': {
+        'sampling': {
+            '()': 'MySite.log.SamplingFilter',
+            'rates': {
+                'django.server': config('LOG_SAMPLE_RATE_SERVER', default=1.0, cast=float),
+            },
         },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-        },
-        'file': {
-            'class': 'logging.FileHandler',
-            'filename': 'logs/MySite.log',
-            'formatter': 'verbose',
+        'async': {
+            '()': 'MySite.log.AsyncQueueHandler',
+            'filters': ['sampling'],
+            'queue_size': config('LOG_QUEUE_SIZE', default=10000, cast=int),
+            'targets': [
+                {'class': 'logging.StreamHandler'},
+                {'class': 'logging.FileHandler', 'filename': 'logs/MySite.log'},
+            ],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['async'],
             'level': 'INFO',
             'propagate': True,
         },
@@ -99,9 +99,25 @@ DATABASES = {
         'PASSWORD': config('PASSWORD'),
         'HOST': config('HOST'),
         'PORT': config('PORT'),
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas receive the reads of GET requests to the shop API
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(config('REPLICA_HOSTS', default='', cast=Csv())):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['MySite.routers.ReplicaRouter']
+# Users keep reading from the primary for this long after a write
+REPLICA_READ_YOUR_WRITES_SECONDS = config('REPLICA_READ_YOUR_WRITES_SECONDS', default=5, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,12 +134,34 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing runs in a bounded pool so login bursts can't starve other endpoints
+PASSWORD_HASHERS = [
+    'account.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=2, cast=int)
+PASSWORD_HASHING_MAX_PENDING = config('PASSWORD_HASHING_MAX_PENDING', default=32, cast=int)
+PASSWORD_HASHING_TIMEOUT = config('PASSWORD_HASHING_TIMEOUT', default=10, cast=int)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'knox.auth.TokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Token bucket rates used by MySite.throttles, named <scope>_user and <scope>_ip
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'register_ip': '10/hour',
+        'confirm_email_user': '5/hour',
+        'confirm_email_ip': '20/hour',
+        'comment_user': '10/min',
+        'comment_ip': '30/min',
+    },
 }
 
 KNOX = {
@@ -134,12 +172,113 @@ KNOX = {
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 
+# Cache configuration
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+    }
+}
+PROFILE_CACHE_TIMEOUT = 300
+
+# Key store configuration
+KEY_STORE_BACKEND = config('KEY_STORE_BACKEND', default='account.backends.RedisKeyStore')
+KEY_STORE_OPTIONS = {}
+
+# Bloom filter of taken usernames and emails for availability checks
+AVAILABILITY_FILTER_ENABLED = config('AVAILABILITY_FILTER_ENABLED', default=False, cast=bool)
+AVAILABILITY_FILTER_SIZE = 2 ** 24
+AVAILABILITY_FILTER_HASHES = 7
+
 # Celery configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Dict schedules are crontab fields, converted in MySite/celery.py so settings do not import Celery
+CELERY_BEAT_SCHEDULE = {
+    'drain-outbox': {
+        'task': 'shop.tasks.drain_outbox',
+        'schedule': 2.0,
+    },
+    'purge-outbox': {
+        'task': 'shop.tasks.purge_outbox',
+        'schedule': timedelta(days=1),
+    },
+    'flush-product-views': {
+        'task': 'shop.tasks.flush_product_views',
+        'schedule': 60.0,
+    },
+    'flush-stock-reservations': {
+        'task': 'shop.tasks.flush_stock_reservations',
+        'schedule': 5.0,
+    },
+    'build-cart-recommendations': {
+        'task': 'shop.tasks.build_cart_recommendations',
+        'schedule': {'hour': 4, 'minute': 0},
+    },
+    'build-similar-products': {
+        'task': 'shop.tasks.build_similar_products',
+        'schedule': {'hour': 5, 'minute': 0, 'day_of_week': 0},
+    },
+    'add-similar-products': {
+        'task': 'shop.tasks.add_similar_products',
+        'schedule': timedelta(minutes=10),
+    },
+    'reconcile-product-ratings': {
+        'task': 'shop.tasks.reconcile_product_ratings',
+        'schedule': {'hour': 3, 'minute': 0},
+    },
+}
+
+# Transactional outbox settings
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_LAG_WARNING_SECONDS = 60
+OUTBOX_RETENTION = timedelta(days=7)
+# Events that used up their attempts are kept this long to be inspected or requeued
+OUTBOX_DEAD_RETENTION = timedelta(days=30)
+
+# Comments on a product within this many seconds share one rating recalculation
+RATING_RECOMPUTE_DELAY = 10
+
+# Encoded JSON of products reused by list pages, shared through the key store if enabled
+PRODUCT_FRAGMENT_CACHE_SIZE = 10000
+PRODUCT_FRAGMENT_SHARED = config('PRODUCT_FRAGMENT_SHARED', default=False, cast=bool)
+PRODUCT_FRAGMENT_TIMEOUT = 3600
+
+# Unfiltered tables above this many rows are paginated with estimated counts
+APPROXIMATE_COUNT_THRESHOLD = 100000
+APPROXIMATE_COUNT_CACHE_TIMEOUT = 60
+
+# Live product updates pushed as server-sent events, fanned out through Redis pub/sub
+LIVE_BACKEND = config('LIVE_BACKEND', default='shop.live.RedisBroadcast')
+LIVE_OPTIONS = {}
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_RETRY_MILLISECONDS = 3000
+
+# Sub-requests allowed in one batch request and threads running them, shared by all batches of a process
+BATCH_MAX_REQUESTS = 10
+BATCH_MAX_WORKERS = 4
+
+# Post-deploy cache warm-up: products warmed by default, threads and products per batch
+CACHE_WARM_LIMIT = 1000
+CACHE_WARM_CONCURRENCY = 4
+CACHE_WARM_BATCH_SIZE = 100
+
+# Guest carts kept in signed cookies until login
+GUEST_CART_COOKIE_AGE = 60 * 60 * 24 * 30
+GUEST_CART_MAX_ITEMS = 50
+
+# Seller statistics
+AUTHOR_STATS_RECENT_DAYS = 7
+AUTHOR_STATS_CACHE_TIMEOUT = 600
+
+# Number of recommendations stored per product
+RECOMMENDATIONS_TOP_K = 10
+# Size of the hashed trigram vectors behind "similar products"
+SIMILAR_PRODUCTS_DIMENSIONS = 256
 
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -162,3 +301,6 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'account.CustomUser'
+
+# Tests run against in-process backends instead of external services
+TEST_RUNNER = 'MySite.test_runner.InMemoryTestRunner'
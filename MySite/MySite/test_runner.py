@@ -0,0 +1,62 @@
+import copy
+import logging.config
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class InMemoryTestRunner(DiscoverRunner):
+    """Test runner that swaps external services for in-process backends.
+
+    It also adds a separate ``replica`` database, so replica routing can
+    be tested against two real databases, and keeps log records out of
+    log files.
+    """
+
+    test_settings = {
+        'KEY_STORE_BACKEND': 'account.backends.InMemoryKeyStore',
+        'LIVE_BACKEND': 'shop.live.InMemoryBroadcast',
+        'CACHES': {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        },
+        'CELERY_TASK_ALWAYS_EAGER': True,
+        # Rolled back test databases reuse product ids, so fragments must not outlive a test.
+        'PRODUCT_FRAGMENT_CACHE_SIZE': 0,
+    }
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Every test client shares one IP, so throttles are off unless a test sets rates.
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+        self._test_settings = override_settings(REST_FRAMEWORK=rest_framework, **self.test_settings)
+        self._test_settings.enable()
+        logging.config.dictConfig(self.console_logging())
+        self.add_replica_database()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    @staticmethod
+    def console_logging():
+        """Return LOGGING with the file targets of queue handlers dropped."""
+        config = copy.deepcopy(settings.LOGGING)
+        for handler in config['handlers'].values():
+            if 'targets' in handler:
+                handler['targets'] = [
+                    target for target in handler['targets'] if 'filename' not in target
+                ] or [{'class': 'logging.NullHandler'}]
+        return config
+
+    @staticmethod
+    def add_replica_database():
+        if 'replica' in connections.settings:
+            return
+        replica = copy.deepcopy(connections.settings['default'])
+        if replica['ENGINE'].endswith('sqlite3'):
+            replica['TEST']['NAME'] = None
+        else:
+            replica['TEST']['NAME'] = f'test_{replica["NAME"]}_replica'
+        connections.settings['replica'] = replica
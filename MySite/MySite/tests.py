@@ -0,0 +1,179 @@
+import json
+import logging
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from account.models import CustomUser
+from shop.models import Product
+from . import batch
+from .log import AsyncQueueHandler, JsonFormatter, SamplingFilter
+
+
+def make_record(name='app', level=logging.INFO, msg='message %s', args=('text',)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class JsonFormatterTests(SimpleTestCase):
+
+    def test_format(self):
+        """Test records are rendered as JSON objects."""
+        data = json.loads(JsonFormatter().format(make_record()))
+        self.assertEqual(data['level'], 'INFO')
+        self.assertEqual(data['logger'], 'app')
+        self.assertEqual(data['message'], 'message text')
+
+
+class SamplingFilterTests(SimpleTestCase):
+
+    def test_rate_is_inherited(self):
+        """Test child loggers use the rate of the closest configured parent."""
+        sampling = SamplingFilter(rates={'django': 0.5, 'django.server': 0.1})
+        self.assertEqual(sampling.rate('django.server'), 0.1)
+        self.assertEqual(sampling.rate('django.request'), 0.5)
+        self.assertEqual(sampling.rate('shop'), 1.0)
+
+    @patch('MySite.log.random.random', return_value=0.5)
+    def test_samples_only_low_levels(self, mock_random):
+        """Test sampled loggers drop info records but keep warnings."""
+        sampling = SamplingFilter(rates={'app': 0.1})
+        self.assertFalse(sampling.filter(make_record()))
+        self.assertTrue(sampling.filter(make_record(level=logging.WARNING)))
+
+
+class AsyncQueueHandlerTests(SimpleTestCase):
+
+    def test_drops_when_full(self):
+        """Test records are dropped and counted instead of blocking."""
+        handler = AsyncQueueHandler(targets=[{'class': 'logging.NullHandler'}], queue_size=1)
+        handler.stop()
+        handler.emit(make_record())
+        handler.emit(make_record(name='noisy'))
+        handler.emit(make_record(name='noisy'))
+        self.assertEqual(handler.dropped['noisy'], 2)
+        handler.queue.get_nowait()
+        handler.emit(make_record())
+        report = handler.queue.get_nowait()
+        self.assertEqual(report.getMessage(), 'Log queue was full, dropped 2 records')
+        handler.close()
+
+
+class BatchViewTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.product = Product.objects.create(name='Test Product', price=100, author=self.user)
+        token = AuthToken.objects.create(user=self.user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        self.url = reverse('api-batch')
+
+    def test_batch(self):
+        """Test sub-requests are answered in order and the token is checked once."""
+        requests = [
+            {'name': 'api-product-detail', 'kwargs': {'slug': self.product.slug}},
+            {'name': 'api-product-comments', 'kwargs': {'slug': self.product.slug}},
+            {'name': 'api-cart-view'},
+            {'name': 'api-profile'},
+        ]
+        with patch.object(TokenAuthentication, 'authenticate', autospec=True,
+                          side_effect=TokenAuthentication.authenticate) as authenticate:
+            response = self.client.post(self.url, {'requests': requests}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(authenticate.call_count, 1)
+        responses = response.data['responses']
+        self.assertEqual([item['status'] for item in responses], [status.HTTP_200_OK] * 4)
+        self.assertEqual(responses[0]['body']['name'], 'Test Product')
+        self.assertEqual(responses[2]['body']['items'], [])
+        self.assertEqual(responses[3]['body']['username'], 'testuser')
+
+    def test_sub_request_errors(self):
+        """Test a failing sub-request does not fail the batch."""
+        requests = [
+            {'name': 'api-product-detail', 'kwargs': {'slug': 'missing'}},
+            {'name': 'api-product-detail', 'kwargs': {'slug': self.product.slug}},
+        ]
+        response = self.client.post(self.url, {'requests': requests}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['status'] for item in response.data['responses']],
+            [status.HTTP_404_NOT_FOUND, status.HTTP_200_OK]
+        )
+
+    def test_anonymous_batch(self):
+        """Test sub-requests of anonymous batches keep their own permission checks."""
+        self.client.credentials()
+        requests = [{'name': 'api-profile'}, {'name': 'api-cart-view'}]
+        response = self.client.post(self.url, {'requests': requests}, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.data['responses']],
+            [status.HTTP_401_UNAUTHORIZED, status.HTTP_200_OK]
+        )
+
+    @override_settings(BATCH_MAX_REQUESTS=1)
+    def test_invalid_batch(self):
+        """Test unknown or state-changing URL names, wrong parameters and oversized batches are rejected."""
+        for requests in (
+            [{'name': 'admin:index'}],
+            [{'name': 'api-recreate-token'}],
+            [{'name': 'api-login'}],
+            [{'name': 'api-product-detail'}],
+            [{'name': 'api-cart-view'}, {'name': 'api-profile'}],
+        ):
+            response = self.client.post(self.url, {'requests': requests}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(BATCH_MAX_WORKERS=4)
+class BatchConcurrencyTests(TransactionTestCase):
+    """Tests for the threaded path, which test case transactions always turn off."""
+
+    client_class = APIClient
+
+    def test_sub_requests_run_on_threads(self):
+        """Test sub-requests outside a transaction run on worker threads and see committed rows."""
+        user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        product = Product.objects.create(name='Test Product', price=100, author=user)
+        token = AuthToken.objects.create(user=user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        threads = set()
+        execute_subrequest = batch.execute_subrequest
+
+        def record_thread(subrequest):
+            threads.add(threading.get_ident())
+            return execute_subrequest(subrequest)
+
+        requests = [
+            {'name': 'api-product-detail', 'kwargs': {'slug': product.slug}},
+            {'name': 'api-cart-view'},
+            {'name': 'api-profile'},
+        ]
+        with patch.object(batch, 'execute_subrequest', record_thread):
+            response = self.client.post(reverse('api-batch'), {'requests': requests}, format='json')
+        self.assertEqual([item['status'] for item in response.data['responses']], [status.HTTP_200_OK] * 3)
+        self.assertEqual(response.data['responses'][0]['body']['name'], 'Test Product')
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_threads_are_reused(self):
+        """Test consecutive batches share the pool's threads and their connections."""
+        user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        token = AuthToken.objects.create(user=user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        threads = set()
+        execute_subrequest = batch.execute_subrequest
+
+        def record_thread(subrequest):
+            threads.add(threading.current_thread())
+            return execute_subrequest(subrequest)
+
+        requests = [{'name': 'api-cart-view'}, {'name': 'api-profile'}, {'name': 'api-product-list-create'}]
+        with patch.object(batch, 'execute_subrequest', record_thread):
+            for _ in range(3):
+                response = self.client.post(reverse('api-batch'), {'requests': requests}, format='json')
+                self.assertEqual([item['status'] for item in response.data['responses']], [status.HTTP_200_OK] * 3)
+        self.assertLessEqual(len(threads), 4)
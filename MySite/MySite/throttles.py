@@ -0,0 +1,64 @@
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from account.backends import get_key_store
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Token bucket throttle kept in the key store.
+
+    Views name a scope per HTTP method in ``throttle_scopes``, and the rate
+    is looked up as ``<scope>_<scope_suffix>`` in DEFAULT_THROTTLE_RATES.
+    A rate of ``10/min`` allows bursts of 10 requests and refills one token
+    every 6 seconds. Methods or scopes without a rate are not throttled.
+    """
+
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+    scope_suffix = None
+
+    def __init__(self):
+        # The rate depends on the view and method, so it is resolved in allow_request().
+        self._wait = None
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(request.method)
+        if scope is None:
+            return True
+        self.scope = f'{scope}_{self.scope_suffix}'
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self._wait = get_key_store().take_token(
+            self.key, self.num_requests, self.num_requests / self.duration
+        )
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Token bucket per authenticated user; anonymous requests are left to the IP scope."""
+
+    scope_suffix = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Token bucket per client IP address."""
+
+    scope_suffix = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
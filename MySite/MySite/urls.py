@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from .batch import BatchView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api-batch/', BatchView.as_view(), name='api-batch'),
     path('account/', include('account.urls')),
     path('', include('shop.urls'))
 ]
@@ -0,0 +1,455 @@
+import fnmatch
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class BaseKeyStore:
+    """Interface of a Redis-compatible key-value store.
+
+    Values are returned as bytes, the same way redis-py returns them.
+    """
+
+    def get(self, name):
+        """Return the value stored at the key or None."""
+        raise NotImplementedError
+
+    def set(self, name, value, ex=None, nx=False):
+        """Store the value at the key, optionally expiring after ``ex`` seconds.
+
+        With ``nx`` the value is only stored if the key does not exist yet,
+        and None is returned otherwise.
+        """
+        raise NotImplementedError
+
+    def setex(self, name, time, value):
+        """Store the value at the key with an expiration time."""
+        return self.set(name, value, ex=time)
+
+    def delete(self, *names):
+        """Delete the keys and return the number of removed keys."""
+        raise NotImplementedError
+
+    def exists(self, *names):
+        """Return the number of the given keys that exist."""
+        raise NotImplementedError
+
+    def incr(self, name, amount=1):
+        """Increment the integer value of the key and return the new value."""
+        raise NotImplementedError
+
+    def expire(self, name, time):
+        """Set an expiration time on the key."""
+        raise NotImplementedError
+
+    def ttl(self, name):
+        """Return seconds to live, -1 for keys without expiry and -2 for missing keys."""
+        raise NotImplementedError
+
+    def keys(self, pattern='*'):
+        """Return all keys matching the glob-style pattern."""
+        raise NotImplementedError
+
+    def getbits(self, name, offsets):
+        """Return the bits at the offsets of a bit string in one round-trip."""
+        raise NotImplementedError
+
+    def setbits(self, name, offsets):
+        """Set the bits at the offsets of a bit string to 1 in one round-trip."""
+        raise NotImplementedError
+
+    def getdel(self, name):
+        """Return the value at the key and delete the key."""
+        raise NotImplementedError
+
+    def sadd(self, name, *values):
+        """Add members to the set and return the number of new members."""
+        raise NotImplementedError
+
+    def spop(self, name, count=None):
+        """Remove and return random members of the set."""
+        raise NotImplementedError
+
+    def pfadd(self, name, *values):
+        """Add elements to the HyperLogLog at the key."""
+        raise NotImplementedError
+
+    def pfcount(self, name):
+        """Return the approximate number of unique elements added to the HyperLogLog."""
+        raise NotImplementedError
+
+    def pipeline(self):
+        """Return a pipeline that sends queued Redis commands in one round-trip on execute()."""
+        raise NotImplementedError
+
+    def take_token(self, name, capacity, refill_rate):
+        """Atomically take a token from the bucket at the key.
+
+        The bucket holds up to ``capacity`` tokens and regains ``refill_rate``
+        tokens per second. Returns whether a token was taken and the seconds
+        to wait for the next one.
+        """
+        raise NotImplementedError
+
+    def flushdb(self):
+        """Remove all keys from the store."""
+        raise NotImplementedError
+
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill_rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill_rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisKeyStore(BaseKeyStore):
+    """Key store backed by a Redis server."""
+
+    def __init__(self, host=None, port=None, db=0):
+        # redis-py is imported here, so processes using another backend never load it.
+        import redis
+        self.client = redis.StrictRedis(
+            host=host or settings.REDIS_HOST,
+            port=port or settings.REDIS_PORT,
+            db=db
+        )
+        # Sent with EVALSHA, so a bucket check is a single round-trip once the script is cached.
+        self._token_bucket = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def get(self, name):
+        return self.client.get(name)
+
+    def set(self, name, value, ex=None, nx=False):
+        return self.client.set(name, value, ex=ex, nx=nx)
+
+    def setex(self, name, time, value):
+        return self.client.setex(name, time, value)
+
+    def delete(self, *names):
+        return self.client.delete(*names)
+
+    def exists(self, *names):
+        return self.client.exists(*names)
+
+    def incr(self, name, amount=1):
+        return self.client.incr(name, amount)
+
+    def expire(self, name, time):
+        return self.client.expire(name, time)
+
+    def ttl(self, name):
+        return self.client.ttl(name)
+
+    def keys(self, pattern='*'):
+        return self.client.keys(pattern)
+
+    def getbits(self, name, offsets):
+        bitfield = self.client.bitfield(name)
+        for offset in offsets:
+            bitfield.get('u1', offset)
+        return bitfield.execute()
+
+    def setbits(self, name, offsets):
+        bitfield = self.client.bitfield(name)
+        for offset in offsets:
+            bitfield.set('u1', offset, 1)
+        return bitfield.execute()
+
+    def getdel(self, name):
+        return self.client.getdel(name)
+
+    def sadd(self, name, *values):
+        return self.client.sadd(name, *values)
+
+    def spop(self, name, count=None):
+        return self.client.spop(name, count)
+
+    def pfadd(self, name, *values):
+        return self.client.pfadd(name, *values)
+
+    def pfcount(self, name):
+        return self.client.pfcount(name)
+
+    def pipeline(self):
+        return self.client.pipeline(transaction=False)
+
+    def take_token(self, name, capacity, refill_rate):
+        allowed, wait = self._token_bucket(keys=[name], args=[capacity, refill_rate])
+        return bool(allowed), float(wait)
+
+    def flushdb(self):
+        return self.client.flushdb()
+
+
+class InMemoryKeyStore(BaseKeyStore):
+    """Thread-safe in-process key store with TTL expiry and an LRU size bound.
+
+    Suitable for tests and single-node deployments, where running Redis
+    only to keep short-lived keys is not worth it. Only keys with an expiry
+    are evicted to stay within ``max_entries``: keys without one hold
+    buffered state such as ``views:dirty`` or ``stock:pending:*`` that
+    would be lost silently, so they may take the store above the bound.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = {}
+        # Keys with an expiry, least recently used first.
+        self._expiring = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _encode(value):
+        """Convert a value to bytes the way Redis stores it."""
+        if isinstance(value, (bytes, bytearray)):
+            return bytes(value)
+        if isinstance(value, str):
+            return value.encode()
+        if isinstance(value, (int, float)):
+            return str(value).encode()
+        raise TypeError(f'Invalid value type: {type(value).__name__}')
+
+    @staticmethod
+    def _key(name):
+        return name.decode() if isinstance(name, bytes) else str(name)
+
+    def _entry(self, name):
+        """Return a live entry for the key, dropping it if it has expired."""
+        key = self._key(name)
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None:
+            if entry[1] <= monotonic():
+                self._drop(key)
+                return None
+            self._expiring.move_to_end(key)
+        return entry
+
+    def _store(self, name, value, expires_at):
+        key = self._key(name)
+        self._data[key] = (value, expires_at)
+        if expires_at is None:
+            self._expiring.pop(key, None)
+        else:
+            self._expiring[key] = None
+            self._expiring.move_to_end(key)
+        while len(self._data) > self.max_entries and self._expiring:
+            self._drop(next(iter(self._expiring)))
+
+    def _drop(self, key):
+        """Remove the key and return whether it existed."""
+        self._expiring.pop(key, None)
+        return self._data.pop(key, None) is not None
+
+    def get(self, name):
+        with self._lock:
+            entry = self._entry(name)
+            return bytes(entry[0]) if entry else None
+
+    def set(self, name, value, ex=None, nx=False):
+        expires_at = monotonic() + ex if ex is not None else None
+        with self._lock:
+            if nx and self._entry(name) is not None:
+                return None
+            self._store(name, self._encode(value), expires_at)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._drop(self._key(name)) for name in names)
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(self._entry(name) is not None for name in names)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            entry = self._entry(name)
+            value, expires_at = entry if entry else (b'0', None)
+            try:
+                value = int(value) + amount
+            except ValueError:
+                raise ValueError('Value is not an integer or out of range')
+            self._store(name, self._encode(value), expires_at)
+            return value
+
+    def expire(self, name, time):
+        with self._lock:
+            entry = self._entry(name)
+            if entry is None:
+                return False
+            self._store(name, entry[0], monotonic() + time)
+            return True
+
+    def ttl(self, name):
+        with self._lock:
+            entry = self._entry(name)
+            if entry is None:
+                return -2
+            if entry[1] is None:
+                return -1
+            return max(0, round(entry[1] - monotonic()))
+
+    def keys(self, pattern='*'):
+        with self._lock:
+            now = monotonic()
+            return [
+                key.encode() for key, (_, expires_at) in self._data.items()
+                if (expires_at is None or expires_at > now) and fnmatch.fnmatchcase(key, pattern)
+            ]
+
+    def getbits(self, name, offsets):
+        with self._lock:
+            entry = self._entry(name)
+            value = entry[0] if entry else b''
+            return [
+                (value[offset // 8] >> (7 - offset % 8)) & 1 if offset // 8 < len(value) else 0
+                for offset in offsets
+            ]
+
+    def setbits(self, name, offsets):
+        with self._lock:
+            entry = self._entry(name)
+            value, expires_at = entry if entry else (bytearray(), None)
+            if not isinstance(value, bytearray):
+                value = bytearray(value)
+            previous = []
+            for offset in offsets:
+                index = offset // 8
+                if index >= len(value):
+                    value.extend(bytes(index - len(value) + 1))
+                mask = 1 << (7 - offset % 8)
+                previous.append(int(bool(value[index] & mask)))
+                value[index] |= mask
+            self._store(name, value, expires_at)
+            return previous
+
+    def getdel(self, name):
+        with self._lock:
+            value = self.get(name)
+            self.delete(name)
+            return value
+
+    def sadd(self, name, *values):
+        with self._lock:
+            entry = self._entry(name)
+            members, expires_at = entry if entry else (set(), None)
+            added = {self._encode(value) for value in values} - members
+            members |= added
+            self._store(name, members, expires_at)
+            return len(added)
+
+    def spop(self, name, count=None):
+        with self._lock:
+            entry = self._entry(name)
+            members = entry[0] if entry else set()
+            popped = [members.pop() for _ in range(min(count or 1, len(members)))]
+            if entry and not members:
+                self.delete(name)
+            if count is None:
+                return popped[0] if popped else None
+            return popped
+
+    def pfadd(self, name, *values):
+        # An exact set stands in for the HyperLogLog in memory.
+        return int(self.sadd(name, *values) > 0)
+
+    def pfcount(self, name):
+        with self._lock:
+            entry = self._entry(name)
+            return len(entry[0]) if entry else 0
+
+    def pipeline(self):
+        return InMemoryPipeline(self)
+
+    def take_token(self, name, capacity, refill_rate):
+        with self._lock:
+            now = monotonic()
+            entry = self._entry(name)
+            tokens, updated = entry[0] if entry else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._store(name, (tokens, now), now + capacity / refill_rate)
+            return allowed, 0.0 if allowed else (1 - tokens) / refill_rate
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expiring.clear()
+        return True
+
+
+class InMemoryPipeline:
+    """Queue of key store commands executed together under the store lock."""
+
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.store._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.commands = []
+
+
+_key_store = None
+_key_store_lock = threading.Lock()
+
+
+def get_key_store():
+    """Return the process-wide key store configured by KEY_STORE_BACKEND."""
+    global _key_store
+    if _key_store is None:
+        with _key_store_lock:
+            if _key_store is None:
+                backend = import_string(settings.KEY_STORE_BACKEND)
+                _key_store = backend(**settings.KEY_STORE_OPTIONS)
+    return _key_store
+
+
+@receiver(setting_changed)
+def reset_key_store(setting, **kwargs):
+    """Drop the cached key store when its settings are overridden."""
+    global _key_store
+    if setting in ('KEY_STORE_BACKEND', 'KEY_STORE_OPTIONS'):
+        _key_store = None
@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, попробуйте позже.'
+    default_code = 'password_hashing_busy'
+
+
+class HashingPool:
+    """Bounded thread pool for CPU-heavy password hashing.
+
+    At most ``workers`` hashes run at once and at most ``max_pending``
+    more wait for a worker; further calls are rejected immediately, so
+    a login burst cannot take every request worker and CPU core.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def run(self, func, *args):
+        """Run the function in the pool and wait for its result."""
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            future = self._executor.submit(self._call, func, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHashingBusy()
+
+    def _call(self, func, args):
+        try:
+            return func(*args)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the process-wide password hashing pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    workers=settings.PASSWORD_HASHING_WORKERS,
+                    max_pending=settings.PASSWORD_HASHING_MAX_PENDING,
+                    timeout=settings.PASSWORD_HASHING_TIMEOUT,
+                )
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    """Recreate the pool when its settings are overridden."""
+    global _pool
+    if setting.startswith('PASSWORD_HASHING_') and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 hasher that computes hashes in the bounded hashing pool.
+
+    It keeps the ``pbkdf2_sha256`` algorithm name, so existing hashes stay valid.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return get_hashing_pool().run(super().encode, password, salt, iterations)
@@ -0,0 +1,70 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so the timings include everything a cold worker pays for.
+PROBE = '''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MySite.settings')
+import django
+django.setup()
+setup = time.perf_counter()
+from django.conf import settings
+from django.test import Client
+host = next((host for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost').lstrip('.')
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, host]
+response = Client(HTTP_HOST=host).get(sys.argv[1])
+first_request = time.perf_counter()
+print(json.dumps({
+    'setup': setup - start,
+    'first_request': first_request - start,
+    'status_code': response.status_code,
+}))
+'''
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Report per-module import time and time to first request of a cold process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api-products/', help='URL requested as the first request.')
+        parser.add_argument('--limit', type=int, default=20, help='Number of modules and packages to list.')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE, options['path']],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode:
+            raise CommandError(f'Startup probe failed:\n{result.stderr[-2000:]}')
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+
+        modules, packages = [], defaultdict(int)
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if match:
+                own, cumulative, indent, name = match.groups()
+                packages[name.split('.')[0]] += int(own)
+                if not indent:
+                    modules.append((int(cumulative), name))
+
+        limit = options['limit']
+        self.stdout.write('Slowest top-level imports (cumulative ms):')
+        for cumulative, name in sorted(modules, reverse=True)[:limit]:
+            self.stdout.write(f'  {cumulative / 1000:9.1f}  {name}')
+        self.stdout.write('Import time by package (ms):')
+        for name, own in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            self.stdout.write(f'  {own / 1000:9.1f}  {name}')
+        self.stdout.write(f'django.setup(): {timings["setup"] * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Time to first request ({options["path"]} -> {timings["status_code"]}): '
+            f'{timings["first_request"] * 1000:.1f} ms'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from account.services import rebuild_availability_filter_service
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Bloom filter of taken usernames and emails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        count = rebuild_availability_filter_service(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Availability filter rebuilt from {count} users.'))
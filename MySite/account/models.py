@@ -1,10 +1,13 @@
+import hashlib
 import json
 from datetime import date
 
-import redis
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
+
+from .backends import get_key_store
 
 
 class CustomUser(AbstractUser):
@@ -16,20 +19,23 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'),
+                condition=~models.Q(email=''),
+                name='unique_user_email_ci',
+            ),
+        ]
 
     def __str__(self):
         return self.username
 
 
 class RedisKeyManager:
-    """Manager for handling Redis keys."""
+    """Manager for handling Redis keys stored in the configured key store."""
 
-    def __init__(self):
-        self.redis_instance = redis.StrictRedis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=0
-        )
+    def __init__(self, store=None):
+        self.redis_instance = store or get_key_store()
 
     def save_key(self, user_id, key, value):
         """Save a key-value pair to Redis with an expiration time."""
@@ -48,4 +54,59 @@ class RedisKeyManager:
 
     def all_keys(self):
         """Retrieve all keys from Redis."""
-        return self.redis_instance.keys('*')
\ No newline at end of file
+        return self.redis_instance.keys('*')
+
+
+class BloomFilter:
+    """Probabilistic set of strings kept as a bit array in the key store.
+
+    A negative answer is exact, a positive one may be a false positive.
+    """
+
+    def __init__(self, name, size, hashes, store=None):
+        self.name = name
+        self.size = size
+        self.hashes = hashes
+        self.store = store or get_key_store()
+
+    def _offsets(self, value):
+        """Return bit offsets for the value using double hashing."""
+        digest = hashlib.blake2b(value.lower().encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, *values):
+        """Add values to the filter in one round-trip."""
+        offsets = [offset for value in values for offset in self._offsets(value)]
+        if offsets:
+            self.store.setbits(self.name, offsets)
+
+    def __contains__(self, value):
+        return all(self.store.getbits(self.name, self._offsets(value)))
+
+    def is_ready(self):
+        """Return True if the filter was fully built and its bits are still stored."""
+        return self.store.exists(self.name, f'{self.name}:ready') == 2
+
+    def mark_ready(self):
+        """Mark the filter as fully built.
+
+        An empty bit string is stored if no value was added, so an empty
+        filter is ready too.
+        """
+        self.store.set(self.name, b'', nx=True)
+        self.store.set(f'{self.name}:ready', 1)
+
+    def clear(self):
+        """Remove the filter from the key store."""
+        self.store.delete(self.name, f'{self.name}:ready')
+
+
+def taken_names_filter():
+    """Return the filter of taken usernames and emails."""
+    return BloomFilter(
+        name='bloom:taken-names',
+        size=settings.AVAILABILITY_FILTER_SIZE,
+        hashes=settings.AVAILABILITY_FILTER_HASHES,
+    )
@@ -1,9 +1,11 @@
 import re
 
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
 from .models import CustomUser, RedisKeyManager
+from .services import invalidate_user_information_service
 
 
 class RegisterCustomUserSerializer(serializers.ModelSerializer):
@@ -14,6 +16,7 @@ class RegisterCustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['username', 'email', 'password1', 'password2']
+        extra_kwargs = {'username': {'validators': []}}
 
     def validate_password1(self, value):
         """Validate that the password is at least 8 characters long."""
@@ -27,16 +30,12 @@ class RegisterCustomUserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Username слишком короткий")
         if not re.match(r'^[a-zA-Zа-яА-ЯёЁ0-9]+$', value):
             raise serializers.ValidationError("Нельзя использовать специальные символы")
-        if CustomUser.objects.filter(username=value).exists():
-            raise serializers.ValidationError('Пользователь с таким username уже существует')
         return value
 
     def validate_email(self, value):
-        """Validate the email for special characters and uniqueness."""
+        """Validate the email for special characters."""
         if not re.match(r'^[a-zA-Zа-яА-ЯёЁ0-9@._]+$', value):
             raise serializers.ValidationError("Нельзя использовать специальные символы")
-        if CustomUser.objects.filter(email=value).exists():
-            raise serializers.ValidationError('Пользователь с таким email уже существует')
         return value
 
     def validate(self, attrs):
@@ -46,16 +45,39 @@ class RegisterCustomUserSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
-        """Create a new user instance."""
+        """Create a new user instance, relying on unique indexes for duplicates."""
         validated_data.pop('password2')
         user = CustomUser(
             username=validated_data['username'],
             email=validated_data['email']
         )
         user.set_password(validated_data['password1'])
-        user.save()
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError as error:
+            field = self.conflicting_field(error, user)
+            if field is None:
+                raise
+            raise serializers.ValidationError({field: [f'Пользователь с таким {field} уже существует']})
         return user
 
+    @staticmethod
+    def conflicting_field(error, user):
+        """Return the field whose uniqueness the failed insert violated, or None for other errors.
+
+        psycopg reports the violated constraint by name; other drivers only
+        give a message, so the existing rows are checked instead.
+        """
+        constraint = getattr(getattr(error.__cause__, 'diag', None), 'constraint_name', None)
+        if constraint == 'unique_user_email_ci':
+            return 'email'
+        if CustomUser.objects.filter(username=user.username).exists():
+            return 'username'
+        if user.email and CustomUser.objects.filter(email__iexact=user.email).exists():
+            return 'email'
+        return None
+
 
 class LoginCustomUserSerializer(serializers.Serializer):
     username = serializers.CharField(required=True, allow_blank=False)
@@ -103,6 +125,13 @@ class AddAboutCustomUserSerializer(serializers.ModelSerializer):
         """Validate the last name."""
         return self.validate_name(value)
 
+    def update(self, instance, validated_data):
+        """Update only the changed name columns."""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 
 class ConfirmEmailSerializer(serializers.Serializer):
     key = serializers.CharField(required=True)
@@ -123,7 +152,8 @@ class ConfirmEmailSerializer(serializers.Serializer):
         if not user:
             raise serializers.ValidationError("User not found.")
         user.is_email_verified = True
-        user.save()
+        user.save(update_fields=['is_email_verified'])
+        invalidate_user_information_service(user)
 
         RedisKeyManager().delete_key(user_id=user_id, key='email')
         return user
@@ -157,4 +187,5 @@ class ChangingPasswordSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("User not found.")
         password1 = self.validated_data['password1']
         user.set_password(password1)
-        user.save()
+        user.save(update_fields=['password'])
+        invalidate_user_information_service(user)
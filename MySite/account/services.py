@@ -1,19 +1,18 @@
 import uuid
 
-from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.urls import reverse
 
 from knox.models import AuthToken
-from .models import RedisKeyManager
+from .models import CustomUser, RedisKeyManager, taken_names_filter
 import logging
 
 logger = logging.getLogger('django')
 
-@shared_task
-def send_async_email_service(username, recipient):
-    """Send a confirmation email asynchronously."""
+def send_confirmation_email_service(username, recipient):
+    """Send a confirmation email with a new key."""
     key = str(uuid.uuid4())
     message = (
         f'MySite \nДля подтверждения почты перейдите по ссылке\n'
@@ -52,4 +51,74 @@ def user_information_service(user):
         'is_superuser': user.is_superuser,
         'created_at': user.created_at,
     }
-    return data
\ No newline at end of file
+    return data
+
+
+def cached_user_information_service(user):
+    """Return user information from the cache, filling it on a miss."""
+    key = f'profile:{user.pk}'
+    data = cache.get(key)
+    if data is None:
+        data = user_information_service(user)
+        cache.set(key, data, settings.PROFILE_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_user_information_service(user):
+    """Drop the cached user information after the user changes."""
+    cache.delete(f'profile:{user.pk}')
+
+
+def remember_taken_names_service(user):
+    """Add the user's username and email to the availability filter."""
+    if settings.AVAILABILITY_FILTER_ENABLED:
+        names = [f'username:{user.username}']
+        if user.email:
+            names.append(f'email:{user.email}')
+        taken_names_filter().add(*names)
+
+
+def availability_service(username=None, email=None):
+    """Check whether the username and email are free to register.
+
+    Names the filter has never seen are reported free without a database query.
+    """
+    taken_filter = None
+    if settings.AVAILABILITY_FILTER_ENABLED:
+        taken_filter = taken_names_filter()
+        if not taken_filter.is_ready():
+            taken_filter = None
+
+    checks = {
+        'username': (username, CustomUser.objects.filter(username=username)),
+        'email': (email, CustomUser.objects.filter(email__iexact=email)),
+    }
+    data = {}
+    for field, (value, queryset) in checks.items():
+        if value is None:
+            continue
+        if taken_filter is not None and f'{field}:{value}' not in taken_filter:
+            data[field] = True
+        else:
+            data[field] = not queryset.exists()
+    return data
+
+
+def rebuild_availability_filter_service(chunk_size=10000):
+    """Rebuild the availability filter from all registered users and return their number."""
+    taken_filter = taken_names_filter()
+    taken_filter.clear()
+    names = []
+    count = 0
+    users = CustomUser.objects.values_list('username', 'email').iterator(chunk_size=chunk_size)
+    for username, email in users:
+        count += 1
+        names.append(f'username:{username}')
+        if email:
+            names.append(f'email:{email}')
+        if len(names) >= chunk_size:
+            taken_filter.add(*names)
+            names = []
+    taken_filter.add(*names)
+    taken_filter.mark_ready()
+    return count
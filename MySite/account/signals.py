@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .services import remember_taken_names_service
+
+
+@receiver(post_save, sender=CustomUser)
+def remember_taken_names(sender, instance, created, **kwargs):
+    """Add the names of every new user to the availability filter, however the user was created."""
+    if created:
+        remember_taken_names_service(instance)
@@ -0,0 +1,8 @@
+from MySite.celery import app
+from .services import send_confirmation_email_service
+
+
+@app.task
+def send_async_email(username, recipient):
+    """Send a confirmation email asynchronously."""
+    send_confirmation_email_service(username, recipient)
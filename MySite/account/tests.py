@@ -1,18 +1,25 @@
+import threading
 from unittest.mock import Mock, patch
 
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APITestCase
 from django.urls import reverse
 
-from .models import CustomUser, RedisKeyManager
+from .backends import InMemoryKeyStore, get_key_store
+from .hashers import HashingPool, PasswordHashingBusy
+from .models import CustomUser, RedisKeyManager, BloomFilter, taken_names_filter
 from .serializers import (
     RegisterCustomUserSerializer,
     LoginCustomUserSerializer,
     AddAboutCustomUserSerializer,
     ConfirmEmailSerializer
 )
-from .services import recreate_token_service, delete_token_service
+from .services import recreate_token_service, delete_token_service, rebuild_availability_filter_service
 
 
 class RegisterViewTests(APITestCase):
@@ -55,6 +62,13 @@ class RegisterViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('email', response.data)
 
+    def test_register_user_with_existing_email_other_case(self):
+        """Test emails are unique regardless of case."""
+        CustomUser.objects.create_user(username='existing_user', email='TestUser@Example.com', password='password')
+        response = self.client.post(self.url, self.valid_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+
     def test_register_user_invalid_email(self):
         """Test registration with an invalid email."""
         response = self.client.post(self.url, self.invalid_data, format='json')
@@ -116,8 +130,10 @@ class RegisterCustomUserSerializerTests(TestCase):
             'password2': 'strongpassword',
         }
         serializer = RegisterCustomUserSerializer(data=data)
-        self.assertFalse(serializer.is_valid())
-        self.assertIn('email', serializer.errors)
+        self.assertTrue(serializer.is_valid())
+        with self.assertRaises(ValidationError) as context:
+            serializer.save()
+        self.assertIn('email', context.exception.detail)
 
     def test_username_already_exists(self):
         """Test serializer with an existing username."""
@@ -129,8 +145,41 @@ class RegisterCustomUserSerializerTests(TestCase):
             'password2': 'strongpassword',
         }
         serializer = RegisterCustomUserSerializer(data=data)
-        self.assertFalse(serializer.is_valid())
-        self.assertIn('username', serializer.errors)
+        self.assertTrue(serializer.is_valid())
+        with self.assertRaises(ValidationError) as context:
+            serializer.save()
+        self.assertIn('username', context.exception.detail)
+
+    def test_conflict_is_found_by_existing_rows(self):
+        """Test the conflicting field does not depend on the database error message."""
+        CustomUser.objects.create_user(username='myemail', email='first@example.com', password='strongpassword')
+        data = {
+            'username': 'myemail',
+            'email': 'second@example.com',
+            'password1': 'strongpassword',
+            'password2': 'strongpassword',
+        }
+        serializer = RegisterCustomUserSerializer(data=data)
+        self.assertTrue(serializer.is_valid())
+        error = IntegrityError('duplicate key value violates unique constraint\nDETAIL: Key (username)=(myemail)')
+        with patch.object(CustomUser, 'save', side_effect=error):
+            with self.assertRaises(ValidationError) as context:
+                serializer.save()
+        self.assertEqual(list(context.exception.detail), ['username'])
+
+    def test_other_integrity_errors_are_raised(self):
+        """Test integrity errors other than duplicates are not reported as a taken username."""
+        data = {
+            'username': 'newuser',
+            'email': 'newuser@example.com',
+            'password1': 'strongpassword',
+            'password2': 'strongpassword',
+        }
+        serializer = RegisterCustomUserSerializer(data=data)
+        self.assertTrue(serializer.is_valid())
+        with patch.object(CustomUser, 'save', side_effect=IntegrityError('NOT NULL constraint failed')):
+            with self.assertRaises(IntegrityError):
+                serializer.save()
 
     def test_create_user(self):
         """Test user creation via serializer."""
@@ -392,7 +441,7 @@ class ConfirmEmailTests(APITestCase):
         self.url = reverse('api-confirm-email')
         self.redis_manager = RedisKeyManager()
 
-    @patch('account.services.send_async_email_service.delay')
+    @patch('account.tasks.send_async_email.delay')
     def test_get_request_sends_email(self, mock_send_email):
         """Test GET request triggers email sending."""
         response = self.client.get(self.url)
@@ -422,3 +471,243 @@ class ConfirmEmailTests(APITestCase):
         """Test POST request without a key returns error."""
         response = self.client.post(self.url, {})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+
+class InMemoryKeyStoreTests(TestCase):
+
+    def setUp(self):
+        """Create a small in-memory key store."""
+        self.store = InMemoryKeyStore(max_entries=3)
+
+    def test_set_and_get(self):
+        """Test values are returned as bytes like in Redis."""
+        self.store.set('key', 'value')
+        self.assertEqual(self.store.get('key'), b'value')
+        self.assertEqual(self.store.ttl('key'), -1)
+        self.assertIsNone(self.store.get('missing'))
+        self.assertEqual(self.store.ttl('missing'), -2)
+
+    @patch('account.backends.monotonic')
+    def test_key_expires(self, mock_monotonic):
+        """Test keys disappear after their TTL."""
+        mock_monotonic.return_value = 100.0
+        self.store.setex('key', 10, 'value')
+        self.assertEqual(self.store.ttl('key'), 10)
+        mock_monotonic.return_value = 110.0
+        self.assertIsNone(self.store.get('key'))
+        self.assertEqual(self.store.keys(), [])
+
+    def test_lru_eviction(self):
+        """Test the least recently used expiring key is evicted above the size bound."""
+        for name in ('a', 'b', 'c'):
+            self.store.set(name, name, ex=60)
+        self.store.get('a')
+        self.store.set('d', 'd', ex=60)
+        self.assertIsNone(self.store.get('b'))
+        self.assertEqual(sorted(self.store.keys()), [b'a', b'c', b'd'])
+
+    def test_keys_without_expiry_are_not_evicted(self):
+        """Test buffered state without a TTL survives the size bound."""
+        self.store.sadd('views:dirty', 1)
+        self.store.incr('views:count:1')
+        for name in ('a', 'b', 'c'):
+            self.store.set(name, name, ex=60)
+        self.assertEqual(sorted(self.store.keys()), [b'c', b'views:count:1', b'views:dirty'])
+        self.store.set('d', 'd')
+        self.assertEqual(sorted(self.store.keys()), [b'd', b'views:count:1', b'views:dirty'])
+        self.store.set('e', 'e')
+        self.assertEqual(len(self.store.keys()), 4)
+
+    def test_expire_keyword(self):
+        """Test expire() takes the same keyword arguments as the Redis backend."""
+        self.store.set('key', 'value')
+        self.assertTrue(self.store.expire('key', time=10))
+        self.assertEqual(self.store.ttl('key'), 10)
+
+    def test_concurrent_incr(self):
+        """Test increments from several threads are not lost."""
+        def worker():
+            for _ in range(500):
+                self.store.incr('counter')
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.store.get('counter'), b'4000')
+
+    def test_pipeline_with_sets(self):
+        """Test pipelined set and HyperLogLog commands."""
+        store = InMemoryKeyStore()
+        pipeline = store.pipeline()
+        pipeline.sadd('dirty', 1, 2).pfadd('unique', 'a', 'b', 'a').getdel('missing')
+        self.assertEqual(pipeline.execute(), [2, 1, None])
+        self.assertEqual(store.pfcount('unique'), 2)
+        self.assertEqual(sorted(store.spop('dirty', 10)), [b'1', b'2'])
+        self.assertEqual(store.exists('dirty'), 0)
+
+    def test_redis_key_manager(self):
+        """Test RedisKeyManager round-trips JSON values through the store."""
+        manager = RedisKeyManager(store=self.store)
+        manager.save_key(user_id='user', key='email', value={'key': 'value'})
+        self.assertEqual(manager.get_key(user_id='user', key='email'), {'key': 'value'})
+        self.assertEqual(self.store.ttl('user:user:key:email'), 86400)
+        manager.delete_key(user_id='user', key='email')
+        self.assertIsNone(manager.get_key(user_id='user', key='email'))
+
+
+
+class TokenBucketTests(APITestCase):
+
+    def setUp(self):
+        """Create an in-memory key store."""
+        self.store = InMemoryKeyStore()
+
+    @patch('account.backends.monotonic')
+    def test_bucket_refills(self, mock_monotonic):
+        """Test a bucket allows a burst, then one request per refilled token."""
+        mock_monotonic.return_value = 100.0
+        results = [self.store.take_token('bucket', 3, 0.5) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+        self.assertEqual(results[-1][1], 2.0)
+        mock_monotonic.return_value = 102.0
+        self.assertTrue(self.store.take_token('bucket', 3, 0.5)[0])
+        self.assertFalse(self.store.take_token('bucket', 3, 0.5)[0])
+
+    def test_login_is_throttled_per_ip(self):
+        """Test LoginView answers 429 once the IP bucket is empty."""
+        get_key_store().flushdb()
+        rates = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login_ip': '2/min'}}
+        with override_settings(REST_FRAMEWORK=rates):
+            data = {'username': 'nobody', 'password': 'wrongpassword'}
+            codes = [self.client.post(reverse('api-login'), data).status_code for _ in range(3)]
+            other_ip = self.client.post(reverse('api-login'), data, REMOTE_ADDR='10.0.0.2').status_code
+        self.assertEqual(codes, [status.HTTP_400_BAD_REQUEST] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(other_ip, status.HTTP_400_BAD_REQUEST)
+
+
+class BloomFilterTests(TestCase):
+
+    def test_membership(self):
+        """Test added values are found and new ones are not."""
+        bloom = BloomFilter('bloom:test', size=2 ** 16, hashes=5, store=InMemoryKeyStore())
+        bloom.add('alice', 'bob')
+        self.assertIn('alice', bloom)
+        self.assertIn('BOB', bloom)
+        self.assertNotIn('carol', bloom)
+        self.assertFalse(bloom.is_ready())
+        bloom.mark_ready()
+        self.assertTrue(bloom.is_ready())
+
+
+@override_settings(AVAILABILITY_FILTER_ENABLED=True)
+class AvailabilityViewTests(APITestCase):
+
+    def setUp(self):
+        """Create a user and build the availability filter."""
+        self.url = reverse('api-availability')
+        CustomUser.objects.create_user(username='takenuser', email='taken@example.com', password='password')
+        rebuild_availability_filter_service()
+
+    def test_new_names_skip_database(self):
+        """Test clearly new names are reported free without queries."""
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'username': 'freshuser', 'email': 'fresh@example.com'})
+        self.assertEqual(response.data, {'username': True, 'email': True})
+
+    def test_taken_names(self):
+        """Test taken names are confirmed against the database."""
+        response = self.client.get(self.url, {'username': 'takenuser', 'email': 'TAKEN@example.com'})
+        self.assertEqual(response.data, {'username': False, 'email': False})
+
+    def test_registered_user_is_added(self):
+        """Test registration adds the new names to the filter."""
+        self.client.post(reverse('api-register'), {
+            'username': 'newuser',
+            'email': 'newuser@example.com',
+            'password1': 'strong_password_123',
+            'password2': 'strong_password_123',
+        }, format='json')
+        response = self.client.get(self.url, {'username': 'newuser'})
+        self.assertEqual(response.data, {'username': False})
+
+    def test_user_created_outside_registration_is_added(self):
+        """Test users created directly, as by the admin or createsuperuser, are added to the filter."""
+        CustomUser.objects.create_user(username='adminmade', email='adminmade@example.com', password='password')
+        response = self.client.get(self.url, {'username': 'adminmade', 'email': 'adminmade@example.com'})
+        self.assertEqual(response.data, {'username': False, 'email': False})
+
+    def test_empty_filter_is_ready(self):
+        """Test a filter rebuilt without any users is ready."""
+        CustomUser.objects.all().delete()
+        self.assertEqual(rebuild_availability_filter_service(), 0)
+        self.assertTrue(taken_names_filter().is_ready())
+
+
+
+class HashingPoolTests(TestCase):
+
+    def test_new_passwords_use_pooled_hasher(self):
+        """Test passwords are hashed in the pool and stay PBKDF2-compatible."""
+        with patch('account.hashers.HashingPool.run', side_effect=lambda func, *args: func(*args)) as mock_run:
+            user = CustomUser.objects.create_user(username='pooleduser', password='strongpassword')
+        mock_run.assert_called()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('strongpassword'))
+
+    def test_rejects_when_full(self):
+        """Test calls beyond the concurrency cap are rejected immediately."""
+        pool = HashingPool(workers=1, max_pending=0, timeout=5)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        thread = threading.Thread(target=pool.run, args=(block,))
+        thread.start()
+        started.wait()
+        with self.assertRaises(PasswordHashingBusy):
+            pool.run(lambda: None)
+        release.set()
+        thread.join()
+        self.assertEqual(pool.run(lambda: 'done'), 'done')
+        pool.shutdown()
+
+
+
+class ProfileCacheTests(APITestCase):
+
+    def setUp(self):
+        """Create an authenticated user with an empty cache."""
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='user', password='password', email='user@example.com')
+        _, self.token = recreate_token_service(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.url = reverse('api-profile')
+
+    def test_profile_is_cached(self):
+        """Test the profile payload is served from the cache."""
+        self.client.get(self.url)
+        with patch('account.services.user_information_service') as mock_service:
+            response = self.client.get(self.url)
+        mock_service.assert_not_called()
+        self.assertEqual(response.data['username'], 'user')
+
+    def test_update_invalidates_profile(self):
+        """Test updating the user drops the cached profile."""
+        self.client.get(self.url)
+        self.client.patch(reverse('api-update'), {'first_name': 'Имя', 'last_name': 'Фамилия'})
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['first_name'], 'Имя')
+
+    def test_confirm_email_invalidates_profile(self):
+        """Test confirming the email drops the cached profile."""
+        self.client.get(self.url)
+        RedisKeyManager().save_key(user_id='user', key='email', value='valid_key')
+        self.client.post(reverse('api-confirm-email') + '?key=valid_key')
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['is_email_verified'])
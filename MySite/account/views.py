@@ -4,18 +4,28 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
+from MySite.throttles import IPTokenBucketThrottle, UserTokenBucketThrottle
+from shop.services import merge_guest_cart_service
+
 from .serializers import (
     RegisterCustomUserSerializer,
     LoginCustomUserSerializer,
     AddAboutCustomUserSerializer,
     ConfirmEmailSerializer, ChangingPasswordSerializer
 )
-from .services import recreate_token_service, send_async_email_service, user_information_service
+from .services import (
+    recreate_token_service,
+    cached_user_information_service,
+    invalidate_user_information_service,
+    availability_service
+)
 
 
 #---------------API----------------
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scopes = {'POST': 'register'}
 
     def post(self, request):
         """Register a new user and return the user and token."""
@@ -23,15 +33,19 @@ class RegisterView(APIView):
         if serializer.is_valid():
             user = serializer.save()
             token = AuthToken.objects.create(user=user)
-            return Response({
+            response = Response({
                 'user': serializer.data,
                 'token': token[1]
             }, status=status.HTTP_201_CREATED)
+            merge_guest_cart_service(request, response, user)
+            return response
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scopes = {'POST': 'login'}
 
     def post(self, request):
         """Login an existing user and return the user and token."""
@@ -39,13 +53,27 @@ class LoginView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             _, token = recreate_token_service(user)
-            return Response({
+            response = Response({
                 'user': serializer.data,
                 'token': token,
             })
+            merge_guest_cart_service(request, response, user)
+            return response
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AvailabilityView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """Check whether a username and email are free to register."""
+        data = availability_service(
+            username=request.GET.get('username'),
+            email=request.GET.get('email')
+        )
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class UpdateUserView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -55,6 +83,7 @@ class UpdateUserView(APIView):
         serializer = AddAboutCustomUserSerializer(user, data=request.data)
         if serializer.is_valid():
             serializer.save()
+            invalidate_user_information_service(user)
             return Response({'update': 'success'})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -72,10 +101,14 @@ class RecreateTokenView(APIView):
 
 class ConfirmEmailView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle, IPTokenBucketThrottle]
+    throttle_scopes = {'GET': 'confirm_email'}
 
     def get(self, request):
         """Send a confirmation email to the authenticated user."""
-        send_async_email_service.delay(request.user.username, request.user.email)
+        # Tasks are imported on first use, so Celery is not loaded at startup.
+        from .tasks import send_async_email
+        send_async_email.delay(request.user.username, request.user.email)
         return Response({'state': 'sent'}, status=status.HTTP_200_OK)
 
     def post(self, request):
@@ -91,7 +124,7 @@ class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         """Return all user information"""
-        data = user_information_service(request.user)
+        data = cached_user_information_service(request.user)
         return Response(data, status=status.HTTP_200_OK)
 
 class ChangingPasswordView(APIView):
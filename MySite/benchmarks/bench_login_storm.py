@@ -0,0 +1,77 @@
+"""Latency of a cheap endpoint while other threads hammer password checks.
+
+Run with ``python manage.py test benchmarks.bench_login_storm``.
+"""
+import statistics
+import threading
+import time
+
+from django.contrib.auth import authenticate
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from account.models import CustomUser
+from account.services import recreate_token_service
+
+STORM_THREADS = 16
+SAMPLES = 200
+
+UNBOUNDED_HASHERS = ['django.contrib.auth.hashers.PBKDF2PasswordHasher']
+POOLED_HASHERS = ['account.hashers.PooledPBKDF2PasswordHasher']
+
+
+class LoginStormBenchmark(TransactionTestCase):
+
+    def setUp(self):
+        """Create a user with a token for the profile endpoint."""
+        self.user = CustomUser.objects.create_user(username='benchuser', password='benchpassword')
+        _, token = recreate_token_service(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+
+    def measure_profile(self):
+        """Return p50 and p95 latency of the profile endpoint in milliseconds."""
+        url = reverse('api-profile')
+        timings = []
+        for _ in range(SAMPLES):
+            start = time.perf_counter()
+            self.client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+    def storm(self, stop):
+        try:
+            while not stop.is_set():
+                try:
+                    authenticate(username='benchuser', password='benchpassword')
+                except Exception:
+                    pass
+        finally:
+            connection.close()
+
+    def measure_during_storm(self):
+        stop = threading.Event()
+        threads = [threading.Thread(target=self.storm, args=(stop,)) for _ in range(STORM_THREADS)]
+        for thread in threads:
+            thread.start()
+        try:
+            return self.measure_profile()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def test_login_storm(self):
+        idle = self.measure_profile()
+        with override_settings(PASSWORD_HASHERS=UNBOUNDED_HASHERS):
+            unbounded = self.measure_during_storm()
+        with override_settings(PASSWORD_HASHERS=POOLED_HASHERS):
+            pooled = self.measure_during_storm()
+
+        print(f'\nprofile latency, {STORM_THREADS} threads checking passwords (p50 / p95 ms)')
+        print(f'  idle                 {idle[0]:8.2f} / {idle[1]:8.2f}')
+        print(f'  unbounded hashing    {unbounded[0]:8.2f} / {unbounded[1]:8.2f}')
+        print(f'  pooled hashing       {pooled[0]:8.2f} / {pooled[1]:8.2f}')
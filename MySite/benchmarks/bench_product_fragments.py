@@ -0,0 +1,62 @@
+"""Encode CPU per product list page at different fragment cache hit ratios.
+
+Run with ``python manage.py test benchmarks.bench_product_fragments``.
+"""
+import time
+
+from django.conf import settings
+from django.test import TransactionTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from account.models import CustomUser
+from shop.fragments import get_fragment_cache, product_fragments
+from shop.models import Product
+from shop.serializers import ProductSerializer
+
+PAGES = 300
+HIT_RATIOS = [0.0, 0.5, 0.9, 1.0]
+
+
+@override_settings(PRODUCT_FRAGMENT_CACHE_SIZE=10000)
+class ProductFragmentBenchmark(TransactionTestCase):
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='benchuser', password='benchpassword')
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {i}', slug=f'product-{i}', price=i + 1,
+                description='Описание товара ' * 10, author=user
+            )
+            for i in range(settings.REST_FRAMEWORK['PAGE_SIZE'])
+        ])
+        self.page = list(Product.objects.only('id', 'version').order_by('id'))
+
+    def measure(self, render, prepare=None):
+        """Return CPU milliseconds spent per page, excluding ``prepare``."""
+        spent = 0.0
+        for _ in range(PAGES):
+            if prepare is not None:
+                prepare()
+            start = time.process_time()
+            render()
+            spent += time.process_time() - start
+        return spent * 1000 / PAGES
+
+    def serialize_page(self):
+        products = Product.objects.select_related('author').order_by('id')
+        JSONRenderer().render(ProductSerializer(products, many=True).data)
+
+    def warm_cache(self, hit_ratio):
+        cache = get_fragment_cache()
+        cache.clear()
+        product_fragments(self.page[:round(len(self.page) * hit_ratio)])
+
+    def fragment_page(self):
+        b'[' + b','.join(product_fragments(self.page)) + b']'
+
+    def test_encode_cpu(self):
+        print(f'\nCPU per page of {len(self.page)} products (ms)')
+        print(f'  serializer + JSONRenderer   {self.measure(self.serialize_page):8.3f}')
+        for hit_ratio in HIT_RATIOS:
+            spent = self.measure(self.fragment_page, prepare=lambda: self.warm_cache(hit_ratio))
+            print(f'  fragments, {hit_ratio:4.0%} hits       {spent:8.3f}')
@@ -0,0 +1,71 @@
+"""Throughput of stock reservations under many parallel buyers.
+
+Run with ``python manage.py test benchmarks.bench_stock_reservation``.
+"""
+import threading
+import time
+
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+
+from account.backends import get_key_store
+from account.models import CustomUser
+from shop.models import Product
+from shop.services import reserve_stock_service, flush_stock_reservations_service
+
+STOCK = 2000
+BUYER_COUNTS = [1, 2, 4, 8, 16]
+
+
+class StockReservationBenchmark(TransactionTestCase):
+
+    def setUp(self):
+        get_key_store().flushdb()
+        self.user = CustomUser.objects.create_user(username='benchuser', password='benchpassword')
+
+    def buy(self, product, start, sold, retries):
+        start.wait()
+        try:
+            while True:
+                try:
+                    reserved = reserve_stock_service(product, 1)
+                except OperationalError:
+                    # SQLite allows one writer at a time and may report a locked database.
+                    retries.append(1)
+                    continue
+                if not reserved:
+                    return
+                sold.append(1)
+        finally:
+            connection.close()
+
+    def run_sale(self, buyers, hot):
+        product = Product.objects.create(
+            name=f'Sale {buyers} {hot}', price=10, description='Text', author=self.user,
+            stock=STOCK, hot_stock=hot
+        )
+        start, sold, retries = threading.Event(), [], []
+        threads = [
+            threading.Thread(target=self.buy, args=(product, start, sold, retries))
+            for _ in range(buyers)
+        ]
+        for thread in threads:
+            thread.start()
+        began = time.perf_counter()
+        start.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        flush_stock_reservations_service()
+        product.refresh_from_db()
+        self.assertEqual(len(sold), STOCK)
+        self.assertEqual(product.stock, 0)
+        return len(sold) / elapsed, len(retries)
+
+    def test_stock_reservation(self):
+        print(f'\nreservations of {STOCK} units, no overselling checked (reservations/s, lock retries)')
+        for hot in (False, True):
+            label = 'key store counter' if hot else 'conditional UPDATE'
+            for buyers in BUYER_COUNTS:
+                throughput, retries = self.run_sale(buyers, hot)
+                print(f'  {label:20} {buyers:3} buyers {throughput:10.0f} {retries:6}')
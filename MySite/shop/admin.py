@@ -1,6 +1,22 @@
 from django.contrib import admin
 
 from shop.models import Product, Comment
+from shop.pagination import ApproximateCountPaginator
 
-admin.site.register(Product)
-admin.site.register(Comment)
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ['name', 'author', 'price', 'rating', 'stock']
+    list_select_related = ['author']
+    search_fields = ['name', 'slug']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'rating', 'created_at']
+    list_select_related = ['author', 'product']
+    raw_id_fields = ['product', 'author']
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,25 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def not_modified_response(request, etag, updated_at):
+    """Return a 304 response if the client's copy matches, otherwise None.
+
+    Views call it with validators from a single indexed lookup, before
+    running the serializer.
+    """
+    response = get_conditional_response(
+        request,
+        etag=quote_etag(etag),
+        last_modified=int(updated_at.timestamp()),
+    )
+    if response is not None:
+        set_validators(response, etag, updated_at)
+    return response
+
+
+def set_validators(response, etag, updated_at):
+    """Attach the ETag and Last-Modified headers to the response."""
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(updated_at.timestamp())
+    return response
@@ -0,0 +1,79 @@
+import logging
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+from .models import OutboxEvent
+
+logger = logging.getLogger('django')
+
+EVENT_TYPES = {}
+_handlers = defaultdict(list)
+
+
+def event(cls):
+    """Register a dataclass as a domain event type."""
+    cls = dataclass(frozen=True)(cls)
+    EVENT_TYPES[cls.__name__] = cls
+    return cls
+
+
+@event
+class ProductCreated:
+    product_id: int
+    author_id: int
+
+
+@event
+class ProductUpdated:
+    product_id: int
+    author_id: int
+
+
+@event
+class CommentCreated:
+    comment_id: int
+    product_id: int
+    author_id: int
+
+
+@event
+class CartChanged:
+    user_id: int
+    product_id: int
+    added: bool
+
+
+def handles(*event_classes):
+    """Register the decorated function as a handler of the event types.
+
+    Events are delivered at least once, so handlers must be idempotent.
+    """
+    def decorator(func):
+        for event_class in event_classes:
+            _handlers[event_class].append(func)
+        return func
+    return decorator
+
+
+def publish_event(domain_event):
+    """Write the event to the outbox; call inside the transaction of the change."""
+    return OutboxEvent.objects.create(
+        event_type=type(domain_event).__name__,
+        payload=asdict(domain_event),
+    )
+
+
+def publish_events(domain_events):
+    """Write several events to the outbox with one bulk insert."""
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(event_type=type(domain_event).__name__, payload=asdict(domain_event))
+        for domain_event in domain_events
+    ])
+
+
+def dispatch_event(outbox_event):
+    """Pass a stored event to every handler registered for its type."""
+    event_class = EVENT_TYPES[outbox_event.event_type]
+    domain_event = event_class(**outbox_event.payload)
+    for handler in _handlers[event_class]:
+        handler(domain_event)
@@ -0,0 +1,153 @@
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from account.backends import get_key_store
+from .models import Product
+from .serializers import ProductSerializer
+
+
+class FragmentCache:
+    """Bounded in-process LRU of encoded JSON fragments.
+
+    With ``shared`` enabled, misses fall back to the key store, so workers
+    reuse fragments encoded by each other. Keys include a version, so
+    entries never need invalidation and simply age out.
+    """
+
+    def __init__(self, max_entries=10000, shared=False, timeout=3600):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """Return a dict of the cached fragments for the keys."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                fragment = self._data.get(key)
+                if fragment is not None:
+                    self._data.move_to_end(key)
+                    found[key] = fragment
+        missing = [key for key in keys if key not in found]
+        if self.shared and missing:
+            pipeline = get_key_store().pipeline()
+            for key in missing:
+                pipeline.get(f'fragment:{key}')
+            shared = {key: fragment for key, fragment in zip(missing, pipeline.execute()) if fragment is not None}
+            self._store(shared)
+            found.update(shared)
+        return found
+
+    def set_many(self, fragments):
+        """Cache the fragments given as a dict of keys to bytes."""
+        self._store(fragments)
+        if self.shared and fragments:
+            pipeline = get_key_store().pipeline()
+            for key, fragment in fragments.items():
+                pipeline.set(f'fragment:{key}', fragment, ex=self.timeout)
+            pipeline.execute()
+
+    def _store(self, fragments):
+        with self._lock:
+            for key, fragment in fragments.items():
+                self._data[key] = fragment
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_fragment_cache = None
+_fragment_cache_lock = threading.Lock()
+
+
+def get_fragment_cache():
+    """Return the process-wide product fragment cache."""
+    global _fragment_cache
+    if _fragment_cache is None:
+        with _fragment_cache_lock:
+            if _fragment_cache is None:
+                _fragment_cache = FragmentCache(
+                    max_entries=settings.PRODUCT_FRAGMENT_CACHE_SIZE,
+                    shared=settings.PRODUCT_FRAGMENT_SHARED,
+                    timeout=settings.PRODUCT_FRAGMENT_TIMEOUT,
+                )
+    return _fragment_cache
+
+
+@receiver(setting_changed)
+def reset_fragment_cache(setting, **kwargs):
+    """Drop the cached fragments when their settings are overridden."""
+    global _fragment_cache
+    if setting.startswith('PRODUCT_FRAGMENT_'):
+        _fragment_cache = None
+
+
+def product_fragments(products, fields=None):
+    """Return the encoded JSON of each product, encoding only cache misses.
+
+    ``products`` need only ``id`` and ``version`` loaded; missing products
+    are fetched in one query loading only the columns of ``fields``.
+    """
+    cache = get_fragment_cache()
+    suffix = f':{",".join(fields)}' if fields is not None else ''
+    keys = {product.pk: f'product:{product.pk}:{product.version}{suffix}' for product in products}
+    fragments = cache.get_many(list(keys.values()))
+    missing = [product_id for product_id, key in keys.items() if key not in fragments]
+    if missing:
+        renderer = JSONRenderer()
+        queryset = Product.objects.filter(pk__in=missing)
+        rows = list(ProductSerializer.select_columns(queryset, fields, 'version'))
+        encoded = {}
+        for product, data in zip(rows, ProductSerializer(rows, many=True, fields=fields).data):
+            key = f'product:{product.pk}:{product.version}{suffix}'
+            encoded[key] = renderer.render(data)
+            # The row may have changed since the page query; serve what was just read.
+            keys[product.pk] = key
+        cache.set_many(encoded)
+        fragments.update(encoded)
+    return [fragments[keys[product.pk]] for product in products if keys[product.pk] in fragments]
+
+
+class FragmentListResponse(Response):
+    """Paginated response whose JSON body is joined from pre-encoded fragments.
+
+    ``data`` is only decoded when something reads it, such as a
+    non-JSON renderer or a test.
+    """
+
+    def __init__(self, envelope, fragments, **kwargs):
+        self.envelope = envelope
+        self.fragments = fragments
+        self._data = None
+        super().__init__(**kwargs)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = {**self.envelope, 'results': [json.loads(fragment) for fragment in self.fragments]}
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def rendered_content(self):
+        if self.accepted_renderer.format != 'json':
+            return super().rendered_content
+        self['Content-Type'] = self.accepted_renderer.media_type
+        body = JSONRenderer().render({**self.envelope, 'results': []})
+        return body[:-len(b'[]}')] + b'[' + b','.join(self.fragments) + b']}'
@@ -0,0 +1,48 @@
+from django.db import transaction
+
+from .events import CommentCreated, ProductCreated, ProductUpdated, handles
+from .live import publish_product_event
+from .models import Comment, Product, ProductVector
+from .serializers import CommentSerializer
+from .services import schedule_product_rating_update, invalidate_author_statistics_service
+
+
+@handles(CommentCreated)
+def update_rating_on_comment(event):
+    """Debounce a rating recalculation for the commented product."""
+    # Handlers run in the outbox worker; importing tasks here keeps Celery out of web startup.
+    from .tasks import recompute_product_rating
+    schedule_product_rating_update(event.product_id, recompute_product_rating)
+
+
+@handles(ProductUpdated)
+def reindex_similar_products(event):
+    """Drop the content vector so the next incremental run re-embeds the product."""
+    ProductVector.objects.filter(product_id=event.product_id).delete()
+
+
+@handles(ProductCreated, ProductUpdated)
+def invalidate_author_statistics_on_product(event):
+    """Drop the statistics of the product's author."""
+    invalidate_author_statistics_service(event.author_id)
+
+
+@handles(CommentCreated)
+def invalidate_author_statistics_on_comment(event):
+    """Drop the statistics of the commented product's author."""
+    author_id = Product.objects.filter(pk=event.product_id).values_list('author_id', flat=True).first()
+    invalidate_author_statistics_service(author_id)
+
+
+@handles(CommentCreated)
+def push_comment(event):
+    """Push the new comment to the product's live streams once the event is processed.
+
+    Publishing waits for the outbox commit, so an event retried because
+    another handler failed is not pushed twice. The comment id lets
+    clients drop repeats after reconnecting.
+    """
+    comment = Comment.objects.select_related('author', 'product').filter(pk=event.comment_id).first()
+    if comment is not None:
+        data = {'id': comment.pk, **CommentSerializer(comment).data}
+        transaction.on_commit(lambda: publish_product_event(event.product_id, 'comment', data))
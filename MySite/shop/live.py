@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import threading
+import weakref
+from collections import defaultdict
+from contextlib import aclosing
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from knox.auth import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('django')
+
+
+class InMemoryBroadcast:
+    """Fan-out of published messages to the subscribers in this process.
+
+    Messages may be published from any thread. Each subscriber reads from
+    a bounded queue on its own event loop, and a subscriber too slow to
+    drain it misses messages instead of holding up the others.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        """Send the bytes message to every subscriber of the channel."""
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """Hand the message to the local subscribers of the channel."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, message)
+            except RuntimeError:
+                # The subscriber's loop is closed; its generator is cleaned up with it.
+                pass
+
+    @staticmethod
+    def _put(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    async def listen(self):
+        """Start receiving messages published by other processes, if the backend has any."""
+
+    async def subscribe(self, channel, heartbeat=None):
+        """Yield the messages published to the channel until the generator is closed.
+
+        With ``heartbeat``, None is yielded after that many idle seconds.
+        """
+        await self.listen()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroadcast(InMemoryBroadcast):
+    """Broadcast through Redis pub/sub.
+
+    Each process holds a single pattern subscription per event loop and
+    fans the messages out to its local subscribers, so a write reaches
+    thousands of open streams with one PUBLISH.
+    """
+
+    prefix = 'live:'
+
+    def __init__(self, queue_size=100, host=None, port=None, db=0):
+        # redis-py is imported here, so processes using another backend never load it.
+        import redis
+        super().__init__(queue_size)
+        self.options = {'host': host or settings.REDIS_HOST, 'port': port or settings.REDIS_PORT, 'db': db}
+        self.client = redis.StrictRedis(**self.options)
+        self._listeners = weakref.WeakKeyDictionary()
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, message)
+
+    async def listen(self):
+        loop = asyncio.get_running_loop()
+        listener = self._listeners.get(loop)
+        if listener is None or listener.done():
+            self._listeners[loop] = loop.create_task(self._listen())
+
+    async def _listen(self):
+        from redis import asyncio as aioredis
+        client = aioredis.StrictRedis(**self.options)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.psubscribe(f'{self.prefix}*')
+            async for message in pubsub.listen():
+                self.deliver(message['channel'].decode()[len(self.prefix):], message['data'])
+        except Exception:
+            # The next subscriber starts a new listener.
+            logger.exception('Live update listener failed')
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broadcast = None
+_broadcast_lock = threading.Lock()
+
+
+def get_broadcast():
+    """Return the process-wide broadcast configured by LIVE_BACKEND."""
+    global _broadcast
+    if _broadcast is None:
+        with _broadcast_lock:
+            if _broadcast is None:
+                backend = import_string(settings.LIVE_BACKEND)
+                _broadcast = backend(**settings.LIVE_OPTIONS)
+    return _broadcast
+
+
+@receiver(setting_changed)
+def reset_broadcast(setting, **kwargs):
+    """Drop the cached broadcast when its settings are overridden."""
+    global _broadcast
+    if setting in ('LIVE_BACKEND', 'LIVE_OPTIONS'):
+        _broadcast = None
+
+
+def publish_product_event(product_id, event, data):
+    """Push an event to the live streams of the product.
+
+    The server-sent events frame is encoded once here, so subscribers
+    only copy bytes.
+    """
+    message = b'event: ' + event.encode() + b'\ndata: ' + JSONRenderer().render(data) + b'\n\n'
+    get_broadcast().publish(f'product:{product_id}', message)
+
+
+async def product_event_stream(product_id):
+    """Yield the server-sent events frames of the product, with keep-alive comments when idle."""
+    yield f'retry: {settings.LIVE_RETRY_MILLISECONDS}\n\n'.encode()
+    messages = get_broadcast().subscribe(f'product:{product_id}', heartbeat=settings.LIVE_HEARTBEAT_SECONDS)
+    async with aclosing(messages):
+        async for message in messages:
+            yield message if message is not None else b': keep-alive\n\n'
+
+
+def authenticate_stream(request):
+    """Return the user of the knox token in the Authorization header or ``?token=``, or None.
+
+    Browsers cannot set headers on EventSource connections, hence the query parameter.
+    """
+    header = request.headers.get('Authorization', '')
+    token = header[len('Token '):] if header.startswith('Token ') else request.GET.get('token')
+    if not token:
+        return None
+    try:
+        user, _ = TokenAuthentication().authenticate_credentials(token.encode())
+    except AuthenticationFailed:
+        return None
+    return user
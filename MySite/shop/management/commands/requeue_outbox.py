@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.services import requeue_outbox_service
+
+
+class Command(BaseCommand):
+    help = 'Retry outbox events that used up OUTBOX_MAX_ATTEMPTS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='Requeue only these events.')
+
+    def handle(self, *args, **options):
+        count = requeue_outbox_service(options['event_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Requeued {count} outbox events.'))
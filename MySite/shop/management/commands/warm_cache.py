@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.services import hot_product_ids_service, warm_cache_service
+
+
+class Command(BaseCommand):
+    help = 'Pre-populate product caches for the hottest products after a deploy or a cache flush.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Warm these products instead of the hottest ones.')
+        parser.add_argument('--by', choices=['views', 'rating'], default='views', help='How to pick hot products.')
+        parser.add_argument('--limit', type=int, default=settings.CACHE_WARM_LIMIT,
+                            help='Number of hot products to warm.')
+        parser.add_argument('--concurrency', type=int, default=settings.CACHE_WARM_CONCURRENCY,
+                            help='Threads, and so database connections, used at once.')
+        parser.add_argument('--batch-size', type=int, default=settings.CACHE_WARM_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--concurrency and --batch-size must be positive.')
+        if not settings.PRODUCT_FRAGMENT_SHARED:
+            self.stderr.write(self.style.WARNING(
+                'PRODUCT_FRAGMENT_SHARED is off, so product fragments are only warmed in this process.'
+            ))
+        product_ids = hot_product_ids_service(by=options['by'], limit=options['limit'], slugs=options['slugs'])
+        start = time.perf_counter()
+
+        def progress(warmed, total):
+            self.stdout.write(f'Warmed {warmed}/{total} products')
+
+        warmed = warm_cache_service(
+            product_ids, concurrency=options['concurrency'], batch_size=options['batch_size'], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Cache warmed for {warmed} products in {time.perf_counter() - start:.1f} s.'
+        ))
@@ -12,12 +12,37 @@ class Product(models.Model):
     description = models.TextField()
     rating = models.DecimalField(default=0, max_digits=2, decimal_places=1)
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='products')
+    view_count = models.PositiveBigIntegerField(default=0)
+    unique_viewers = models.PositiveBigIntegerField(default=0)
+    stock = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    comments_version = models.PositiveIntegerField(default=0)
+    comments_updated_at = models.DateTimeField(auto_now_add=True)
+    hot_stock = models.BooleanField(
+        default=False,
+        help_text='Reserve stock through the key store counter and write it to the database in the background.'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-view_count', '-id'], name='product_popularity_idx'),
+            models.Index(fields=['author', 'id'], name='product_author_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        """Create a unique slug for the product."""
+        """Create a unique slug for the product and bump the version of an existing one.
+
+        The version is incremented in the database, so concurrent writes
+        never share a version number.
+        """
+        update_fields = kwargs.get('update_fields')
+        bump_version = not self._state.adding and (update_fields is None or 'version' in update_fields)
+        if bump_version:
+            self.version = models.F('version') + 1
         if not self.slug:
             original_slug = slugify(self.name)
             self.slug = original_slug
@@ -26,18 +51,38 @@ class Product(models.Model):
                 self.slug = f"{original_slug}-{counter}"
                 counter += 1
         super().save(*args, **kwargs)
+        if bump_version:
+            self.refresh_from_db(fields=['version'])
 
 
 class Cart(models.Model):
     """Model representing a user's shopping cart."""
 
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    products = models.ManyToManyField(Product, related_name='products')
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='cart')
+    products = models.ManyToManyField(Product, through='CartItem', related_name='products')
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.user}`s cart'
 
 
+class CartItem(models.Model):
+    """Model representing a product line in a cart."""
+
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} in cart {self.cart_id}'
+
+
 class Comment(models.Model):
     """Model representing a comment on a product."""
 
@@ -48,4 +93,57 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f'Comment by {self.author} on {self.product.slug}'
\ No newline at end of file
+        return f'Comment by {self.author} on {self.product.slug}'
+
+
+class ProductRecommendation(models.Model):
+    """Precomputed neighbor of a product, ranked within its recommendation kind."""
+
+    CART = 'cart'
+    SIMILAR = 'similar'
+    KIND_CHOICES = [
+        (CART, 'Frequently carted together'),
+        (SIMILAR, 'Similar content'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'kind', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.recommended} for {self.product}'
+
+
+class ProductVector(models.Model):
+    """Normalized content vector of a product stored as float32 bytes."""
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    vector = models.BinaryField()
+
+    def __str__(self):
+        return f'Vector of {self.product_id}'
+
+
+class OutboxEvent(models.Model):
+    """Domain event stored in the same transaction as the change that caused it."""
+
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} #{self.pk}'
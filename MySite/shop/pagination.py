@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def estimated_count(queryset):
+    """Return the row count of a queryset, estimated for large unfiltered tables.
+
+    PostgreSQL uses the planner statistics in pg_class; other databases
+    reuse an exact count cached for APPROXIMATE_COUNT_CACHE_TIMEOUT.
+    Filtered querysets and tables below APPROXIMATE_COUNT_THRESHOLD are
+    counted exactly.
+    """
+    if queryset.query.where:
+        return queryset.count()
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been analyzed.
+        if row and row[0] >= settings.APPROXIMATE_COUNT_THRESHOLD:
+            return row[0]
+        return queryset.count()
+    key = f'count:{queryset.db}:{table}'
+    count = cache.get(key)
+    if count is None or count < settings.APPROXIMATE_COUNT_THRESHOLD:
+        count = queryset.count()
+        cache.set(key, count, settings.APPROXIMATE_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class ApproximateCountPaginator(Paginator):
+    """Paginator that uses estimated_count() instead of an exact COUNT(*).
+
+    With an estimate the last page number may be slightly off, which is
+    acceptable for very large tables.
+    """
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class ApproximateCountPagination(PageNumberPagination):
+    """Page number pagination with an estimated total count."""
+
+    django_paginator_class = ApproximateCountPaginator
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset pagination by descending id, without a count query.
+
+    Each page is fetched with ``id < last seen id``, so deep pages cost
+    the same as the first one when an index ends with ``id``.
+    """
+
+    ordering = '-id'
@@ -0,0 +1,287 @@
+import numpy as np
+from django.db import transaction
+
+from .models import Cart, Product, ProductRecommendation, ProductVector
+
+HASH_PRIME = np.uint64(1000003)
+HASH_MIX = np.uint64(0xBF58476D1CE4E5B9)
+
+
+def _merge_counts(keys, counts, new_keys, new_counts):
+    """Sum counts of equal keys across two (keys, counts) pairs."""
+    keys = np.concatenate([keys, new_keys])
+    counts = np.concatenate([counts, new_counts])
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return unique_keys, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def _cart_pairs(cart_ids, product_ids):
+    """Return (product, other product) pairs for items sharing a cart.
+
+    Both arrays must be sorted by cart id.
+    """
+    starts = np.flatnonzero(np.r_[True, cart_ids[1:] != cart_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(cart_ids)])
+    item_sizes = np.repeat(sizes, sizes)
+    item_starts = np.repeat(starts, sizes)
+    left = np.repeat(product_ids, item_sizes)
+    group_offsets = np.repeat(np.cumsum(item_sizes) - item_sizes, item_sizes)
+    right = product_ids[np.repeat(item_starts, item_sizes) + np.arange(len(left)) - group_offsets]
+    distinct = left != right
+    return left[distinct], right[distinct]
+
+
+def cart_cooccurrence(chunk_size=10000):
+    """Count how often every pair of products shares a cart.
+
+    Carts are read in primary key chunks, so memory depends on the number
+    of distinct pairs rather than the number of carts. Returns arrays of
+    products, co-occurring products and counts.
+    """
+    through = Cart.products.through
+    base = (Product.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    keys = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    last_cart_id = 0
+    while True:
+        cart_ids = list(
+            Cart.objects.filter(pk__gt=last_cart_id).order_by('pk')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not cart_ids:
+            break
+        rows = np.array(
+            through.objects.filter(cart_id__gte=cart_ids[0], cart_id__lte=cart_ids[-1])
+            .order_by('cart_id').values_list('cart_id', 'product_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        last_cart_id = cart_ids[-1]
+        if not len(rows):
+            continue
+        left, right = _cart_pairs(rows[:, 0], rows[:, 1])
+        chunk_keys, chunk_counts = np.unique(left * base + right, return_counts=True)
+        keys, counts = _merge_counts(keys, counts, chunk_keys, chunk_counts)
+    return keys // base, keys % base, counts
+
+
+def top_k(products, neighbors, scores, k):
+    """Keep the k best scored neighbors of every product, ranked from 0."""
+    order = np.lexsort((neighbors, -scores, products))
+    products, neighbors, scores = products[order], neighbors[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, products[1:] != products[:-1]])
+    sizes = np.diff(np.r_[starts, len(products)])
+    ranks = np.arange(len(products)) - np.repeat(starts, sizes)
+    keep = ranks < k
+    return products[keep], neighbors[keep], scores[keep], ranks[keep]
+
+
+def store_recommendations(kind, products, neighbors, scores, ranks, product_ids=None, batch_size=5000):
+    """Replace the stored recommendations of a kind, optionally only for some products."""
+    recommendations = [
+        ProductRecommendation(product_id=product, recommended_id=neighbor, kind=kind, rank=rank, score=score)
+        for product, neighbor, score, rank in zip(
+            products.tolist(), neighbors.tolist(), scores.tolist(), ranks.tolist()
+        )
+    ]
+    stored = ProductRecommendation.objects.filter(kind=kind)
+    if product_ids is not None:
+        stored = stored.filter(product_id__in=product_ids)
+    with transaction.atomic():
+        stored.delete()
+        ProductRecommendation.objects.bulk_create(recommendations, batch_size=batch_size)
+    return len(recommendations)
+
+
+def build_cart_recommendations(k=10, chunk_size=10000):
+    """Rebuild "frequently carted together" recommendations and return their number."""
+    products, neighbors, counts = cart_cooccurrence(chunk_size=chunk_size)
+    return store_recommendations(ProductRecommendation.CART, *top_k(products, neighbors, counts, k))
+
+
+
+def text_vector(text, dimensions):
+    """Embed text as hashed, signed character trigram counts.
+
+    Counts are damped with a logarithm and the vector is L2-normalized, so
+    a dot product of two vectors is their cosine similarity. No corpus
+    statistics are involved, which keeps incremental updates exact.
+    """
+    codes = np.frombuffer(f'  {text.lower()}  '.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    grams = (codes[:-2] * HASH_PRIME + codes[1:-1]) * HASH_PRIME + codes[2:]
+    grams = (grams ^ (grams >> np.uint64(29))) * HASH_MIX
+    grams ^= grams >> np.uint64(32)
+    buckets = (grams % np.uint64(dimensions)).astype(np.intp)
+    signs = np.where(grams >> np.uint64(63), -1.0, 1.0)
+    vector = np.zeros(dimensions, dtype=np.float64)
+    np.add.at(vector, buckets, signs)
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).astype(np.float32)
+
+
+def product_text(name, description):
+    """Return the text to embed, with the name weighted above the description."""
+    return f'{name} {name} {description}'
+
+
+def vectorize_products(products, dimensions):
+    """Embed and store vectors of (id, name, description) rows; return ids and matrix."""
+    ids = np.array([product_id for product_id, _, _ in products], dtype=np.int64)
+    matrix = np.vstack([
+        text_vector(product_text(name, description), dimensions) for _, name, description in products
+    ]) if products else np.empty((0, dimensions), dtype=np.float32)
+    ProductVector.objects.filter(product_id__in=ids.tolist()).delete()
+    ProductVector.objects.bulk_create([
+        ProductVector(product_id=product_id, vector=vector.tobytes())
+        for product_id, vector in zip(ids.tolist(), matrix)
+    ])
+    return ids, matrix
+
+
+def stored_vector_blocks(chunk_size):
+    """Yield (ids, matrix) blocks of all stored vectors in primary key order."""
+    last_id = 0
+    while True:
+        rows = list(
+            ProductVector.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'vector')[:chunk_size]
+        )
+        if not rows:
+            return
+        ids = np.array([product_id for product_id, _ in rows], dtype=np.int64)
+        matrix = np.vstack([np.frombuffer(bytes(vector), dtype=np.float32) for _, vector in rows])
+        yield ids, matrix
+        last_id = rows[-1][0]
+
+
+class NearestNeighbors:
+    """Running top-k of candidate blocks by dot product for a set of query vectors."""
+
+    def __init__(self, ids, matrix, k):
+        self.ids = ids
+        self.matrix = matrix
+        self.k = k
+        self.scores = np.full((len(ids), k), -np.inf, dtype=np.float32)
+        self.neighbors = np.zeros((len(ids), k), dtype=np.int64)
+
+    def add_block(self, ids, matrix, query_block_size=1024):
+        """Merge one block of candidates into the running top-k."""
+        for start in range(0, len(self.ids), query_block_size):
+            rows = slice(start, start + query_block_size)
+            scores = self.matrix[rows] @ matrix.T
+            scores[self.ids[rows, None] == ids[None, :]] = -np.inf
+            merged_scores = np.hstack([self.scores[rows], scores])
+            merged_ids = np.hstack([self.neighbors[rows], np.broadcast_to(ids, scores.shape)])
+            best = np.argpartition(-merged_scores, self.k - 1, axis=1)[:, :self.k]
+            self.scores[rows] = np.take_along_axis(merged_scores, best, axis=1)
+            self.neighbors[rows] = np.take_along_axis(merged_ids, best, axis=1)
+
+    def result(self):
+        """Return flat (product, neighbor, score, rank) arrays of positive matches."""
+        products = np.repeat(self.ids, self.k)
+        neighbors, scores = self.neighbors.ravel(), self.scores.ravel()
+        keep = scores > 0
+        return top_k(products[keep], neighbors[keep], scores[keep], self.k)
+
+
+def build_similar_products(k=10, dimensions=256, chunk_size=10000):
+    """Rebuild content vectors and "similar products" for the whole catalog.
+
+    Vectors are compared in blocks of chunk_size products, so memory grows
+    with the catalog size times the vector size, never with its square.
+    """
+    ProductVector.objects.all().delete()
+    blocks = []
+    last_id = 0
+    while True:
+        products = list(
+            Product.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'name', 'description')[:chunk_size]
+        )
+        if not products:
+            break
+        blocks.append(vectorize_products(products, dimensions))
+        last_id = products[-1][0]
+
+    if not blocks:
+        ProductRecommendation.objects.filter(kind=ProductRecommendation.SIMILAR).delete()
+        return 0
+    ids = np.concatenate([block_ids for block_ids, _ in blocks])
+    matrix = np.vstack([block for _, block in blocks])
+    neighbors = NearestNeighbors(ids, matrix, k)
+    for block_ids, block in blocks:
+        neighbors.add_block(block_ids, block)
+    return store_recommendations(ProductRecommendation.SIMILAR, *neighbors.result())
+
+
+def add_similar_products(k=10, dimensions=256, chunk_size=10000):
+    """Add products without a vector to the "similar products" index.
+
+    New products get their neighbors from one pass over the stored vectors,
+    and existing products only have their lists rewritten when a new
+    product beats their current k-th neighbor. Products whose lists hold a
+    re-indexed (updated) product have stale scores, so their lists are
+    recomputed in a second pass. Returns the number of added products.
+    """
+    products = list(
+        Product.objects.filter(vector__isnull=True).order_by('pk')
+        .values_list('pk', 'name', 'description')[:chunk_size]
+    )
+    if not products:
+        return 0
+    new_ids, new_matrix = vectorize_products(products, dimensions)
+    stale_ids = np.array(sorted(set(
+        ProductRecommendation.objects
+        .filter(kind=ProductRecommendation.SIMILAR, recommended_id__in=new_ids.tolist())
+        .exclude(product_id__in=new_ids.tolist())
+        .values_list('product_id', flat=True)
+    )), dtype=np.int64)
+    neighbors = NearestNeighbors(new_ids, new_matrix, k)
+    candidates = []
+    stale_blocks = []
+    for block_ids, block in stored_vector_blocks(chunk_size):
+        neighbors.add_block(block_ids, block)
+        stale = np.isin(block_ids, stale_ids)
+        if stale.any():
+            stale_blocks.append((block_ids[stale], block[stale]))
+        existing = ~np.isin(block_ids, new_ids) & ~stale
+        block_ids, block = block_ids[existing], block[existing]
+        if not len(block_ids):
+            continue
+        thresholds = dict(
+            ProductRecommendation.objects
+            .filter(kind=ProductRecommendation.SIMILAR, rank=k - 1, product_id__in=block_ids.tolist())
+            .values_list('product_id', 'score')
+        )
+        threshold = np.array([thresholds.get(product_id, 0.0) for product_id in block_ids.tolist()])
+        scores = block @ new_matrix.T
+        rows, columns = np.nonzero(scores > threshold[:, None])
+        candidates.append((block_ids[rows], new_ids[columns], scores[rows, columns]))
+
+    store_recommendations(ProductRecommendation.SIMILAR, *neighbors.result(), product_ids=new_ids.tolist())
+    if stale_blocks:
+        stale_ids = np.concatenate([ids for ids, _ in stale_blocks])
+        stale_neighbors = NearestNeighbors(stale_ids, np.vstack([block for _, block in stale_blocks]), k)
+        for block_ids, block in stored_vector_blocks(chunk_size):
+            stale_neighbors.add_block(block_ids, block)
+        store_recommendations(
+            ProductRecommendation.SIMILAR, *stale_neighbors.result(), product_ids=stale_ids.tolist()
+        )
+    if candidates:
+        candidate_products, candidate_neighbors, candidate_scores = (
+            np.concatenate(parts) for parts in zip(*candidates)
+        )
+        affected = np.unique(candidate_products).tolist()
+        current = np.array(
+            ProductRecommendation.objects
+            .filter(kind=ProductRecommendation.SIMILAR, product_id__in=affected)
+            .values_list('product_id', 'recommended_id', 'score'),
+            dtype=np.float64,
+        ).reshape(-1, 3)
+        store_recommendations(ProductRecommendation.SIMILAR, *top_k(
+            np.concatenate([current[:, 0].astype(np.int64), candidate_products]),
+            np.concatenate([current[:, 1].astype(np.int64), candidate_neighbors]),
+            np.concatenate([current[:, 2], candidate_scores]),
+            k,
+        ), product_ids=affected)
+    return len(products)
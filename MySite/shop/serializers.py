@@ -1,6 +1,10 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
 from rest_framework import serializers
 
-from .models import Product, Comment, Cart
+from .events import ProductCreated, ProductUpdated, CommentCreated, publish_event
+from .models import Product, Comment, CartItem, ProductRecommendation
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -10,9 +14,44 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ['slug', 'name', 'price', 'description', 'author', 'rating']
+        fields = ['slug', 'name', 'price', 'description', 'author', 'rating', 'stock']
         read_only_fields = ['slug', 'author', 'rating']
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """Serialize only the given fields, or all of them if ``fields`` is None."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def parse_fields(cls, value):
+        """Return the field names of a comma-separated ?fields= value in declaration order.
+
+        Returns None, meaning all fields, if the value is empty.
+        """
+        if not value:
+            return None
+        requested = {name.strip() for name in value.split(',')} - {''}
+        unknown = sorted(requested - set(cls.Meta.fields))
+        if unknown:
+            raise serializers.ValidationError({'fields': f'Unknown fields: {", ".join(unknown)}.'})
+        return [name for name in cls.Meta.fields if name in requested] or None
+
+    @staticmethod
+    def select_columns(queryset, fields, *required):
+        """Load only the ``required`` columns and those the fields need.
+
+        Authors are joined only when they are requested.
+        """
+        if fields is None:
+            return queryset.select_related('author')
+        columns = [*required, *(name for name in fields if name != 'author')]
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+            columns.append('author__username')
+        return queryset.only(*columns)
+
     def get_author(self, obj):
         """Get the username of the product author."""
         return obj.author.username
@@ -40,14 +79,26 @@ class ProductSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Create a new product."""
         validated_data['author'] = self.context['request'].user
-        return super().create(validated_data)
+        with transaction.atomic():
+            product = super().create(validated_data)
+            publish_event(ProductCreated(product_id=product.pk, author_id=product.author_id))
+        return product
 
     def update(self, instance, validated_data):
-        """Update an existing product."""
+        """Update an existing product.
+
+        Only the changed columns are written, so stock reserved, views
+        flushed or ratings recomputed since the row was loaded are kept.
+        """
         request_user = self.context['request'].user
         if instance.author != request_user:
             raise serializers.ValidationError("You cannot update this product.")
-        return super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        with transaction.atomic():
+            instance.save(update_fields=[*validated_data, 'version', 'updated_at'])
+            publish_event(ProductUpdated(product_id=instance.pk, author_id=instance.author_id))
+        return instance
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -85,30 +136,67 @@ class CommentSerializer(serializers.ModelSerializer):
         """Create a new comment."""
         validated_data['author'] = self.context['request'].user
         validated_data['product'] = self.context['product']
-        return super().create(validated_data)
+        with transaction.atomic():
+            comment = super().create(validated_data)
+            Product.objects.filter(pk=comment.product_id).update(
+                comments_version=F('comments_version') + 1,
+                comments_updated_at=Now()
+            )
+            publish_event(CommentCreated(
+                comment_id=comment.pk,
+                product_id=comment.product_id,
+                author_id=comment.author_id
+            ))
+        return comment
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    """Serializer for a cart line with the product price and line total."""
+
+    slug = serializers.CharField(source='product.slug')
+    name = serializers.CharField(source='product.name')
+    price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2)
 
+    class Meta:
+        model = CartItem
+        fields = ['slug', 'name', 'price', 'quantity', 'line_total']
 
-class CartSerializer(serializers.ModelSerializer):
-    """Serializer for the Cart model, including product details."""
 
-    products = serializers.SerializerMethodField()
+class CartSerializer(serializers.Serializer):
+    """Serializer for the cart lines and their total."""
 
-    class Meta:
-        model = Cart
-        fields = ['products']
-
-    def get_products(self, obj):
-        """Retrieve the names of products in the cart."""
-        return [product.name for product in obj.products.all()]
+    items = CartItemSerializer(many=True)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
 
 
 class FindProductToCartSerializer(serializers.Serializer):
     """Serializer for validating product slugs when adding to the cart."""
 
     product_slug = serializers.SlugField()
+    quantity = serializers.IntegerField(min_value=1, max_value=1000, default=1)
 
     def validate_product_slug(self, value):
         """Validate that the product exists based on its slug."""
         if not Product.objects.filter(slug=value).exists():
             raise serializers.ValidationError("Product with this slug does not exist.")
-        return value
\ No newline at end of file
+        return value
+
+
+class ReserveStockSerializer(serializers.Serializer):
+    """Serializer for validating the quantity of a stock reservation."""
+
+    quantity = serializers.IntegerField(min_value=1, max_value=1000)
+
+
+class ProductRecommendationSerializer(serializers.ModelSerializer):
+    """Serializer for a recommended product and its score."""
+
+    slug = serializers.CharField(source='recommended.slug')
+    name = serializers.CharField(source='recommended.name')
+    price = serializers.DecimalField(source='recommended.price', max_digits=10, decimal_places=2)
+    rating = serializers.DecimalField(source='recommended.rating', max_digits=2, decimal_places=1)
+
+    class Meta:
+        model = ProductRecommendation
+        fields = ['slug', 'name', 'price', 'rating', 'score']
@@ -1,42 +1,610 @@
-from .models import Product, Comment, Cart
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import serializers
+from django.db import connection, connections, transaction
+from django.db.models import (
+    Avg, Case, Count, DecimalField, ExpressionWrapper, F, Max, OuterRef, PositiveBigIntegerField, Q, Subquery,
+    Sum, Value, When, Window
+)
+from django.db.models.functions import Coalesce, Greatest, Now, Round
+from django.utils import timezone
+
+from account.backends import get_key_store
+from account.models import CustomUser
+from MySite.routers import mark_recent_write
+from .events import CartChanged, publish_event, publish_events, dispatch_event
+from .fragments import product_fragments
+from .live import publish_product_event
+from .models import Product, Comment, Cart, CartItem, OutboxEvent
+from .pagination import estimated_count
 from .serializers import ProductSerializer, CommentSerializer, CartSerializer, FindProductToCartSerializer
 
-def update_product_rating(product):
-    """Update the rating of the given product based on its comments."""
+logger = logging.getLogger('django')
+
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'shop.guest_cart'
+
+
+def product_rating_expression():
+    """Return the average comment rating of the outer product, rounded like Product.rating."""
+    average = (
+        Comment.objects.filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(average=Avg('rating'))
+        .values('average')
+    )
+    return Coalesce(Round(Subquery(average), 1), Value(0), output_field=DecimalField(max_digits=2, decimal_places=1))
+
+
+def update_product_rating(product_id):
+    """Recalculate the rating of the product in a single UPDATE statement."""
+    Product.objects.filter(pk=product_id).update(
+        rating=product_rating_expression(),
+        version=F('version') + 1,
+        updated_at=Now()
+    )
+
+
+def schedule_product_rating_update(product_id, recompute_task):
+    """Schedule one rating recalculation per product and debounce window.
+
+    Only the first comment of a window schedules the task; the ones
+    arriving before it runs are covered by the same recalculation.
+    """
+    key = f'rating:pending:{product_id}'
+    delay = settings.RATING_RECOMPUTE_DELAY
+    if get_key_store().set(key, 1, ex=delay * 10, nx=True):
+        recompute_task.apply_async((product_id,), countdown=delay)
+
 
-    comments = product.comments.all()
-    count = len(comments)
+def recompute_product_rating_service(product_id):
+    """Run a scheduled recalculation, reopening the debounce window first."""
+    get_key_store().delete(f'rating:pending:{product_id}')
+    update_product_rating(product_id)
+    rating = Product.objects.filter(pk=product_id).values_list('rating', flat=True).first()
+    if rating is not None:
+        # Rendered as a string, like ProductSerializer renders decimals.
+        publish_product_event(product_id, 'rating', {'rating': str(rating)})
 
-    if count == 0:
+
+def reconcile_product_ratings_service(chunk_size=1000):
+    """Fix rating drift across all products, one primary key range at a time.
+
+    Returns the number of corrected products.
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Product.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return fixed
+        fixed += (
+            Product.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+            .alias(computed=product_rating_expression())
+            .exclude(rating=F('computed'))
+            .update(rating=product_rating_expression(), version=F('version') + 1, updated_at=Now())
+        )
+        last_id = ids[-1]
+
+
+def cart_data(user):
+    """Return the cart lines with prices and the total computed by the database in one query."""
+    line_total = ExpressionWrapper(
+        F('quantity') * F('product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    items = list(
+        CartItem.objects.filter(cart__user=user)
+        .select_related('product')
+        .annotate(line_total=line_total, total=Window(Sum(line_total)))
+        .order_by('id')
+    )
+    total = items[0].total if items else Decimal('0.00')
+    return CartSerializer({'items': items, 'total': total}).data
+
+
+def upsert_cart_items(cart_id, quantities):
+    """Insert cart lines or add to their quantities in a single statement and bump the cart version.
+
+    ``quantities`` maps product ids to the quantities to add.
+    """
+    if not quantities:
         return
-    total_rating = sum(comment.rating for comment in comments)
-    product.rating = total_rating / count
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    rows = ', '.join(['(%s, %s, %s)'] * len(quantities))
+    params = [value for product_id, quantity in quantities.items() for value in (cart_id, product_id, quantity)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (cart_id, product_id, quantity) VALUES {rows} '
+            f'ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity',
+            params
+        )
+    Cart.objects.filter(pk=cart_id).update(version=F('version') + 1, updated_at=Now())
+
+
+def cart_validators_service(user):
+    """Return the ETag and last modification time of the user's cart, or None without a cart.
+
+    Both cover the carted products as well, so price changes and deleted
+    products invalidate the client's copy without touching the cart.
+    """
+    cart = (
+        Cart.objects.filter(user=user)
+        .annotate(
+            line_count=Count('items'),
+            product_versions=Coalesce(Sum('items__product__version'), 0),
+            products_updated_at=Max('items__product__updated_at'),
+        )
+        .values('pk', 'version', 'updated_at', 'line_count', 'product_versions', 'products_updated_at')
+        .first()
+    )
+    if cart is None:
+        return None
+    etag = f'cart-{cart["pk"]}-{cart["version"]}-{cart["line_count"]}-{cart["product_versions"]}'
+    updated_at = max(filter(None, (cart['updated_at'], cart['products_updated_at'])))
+    return etag, updated_at
 
 
 def get_cart(request):
-    """Retrieve the user's cart, creating it if it does not exist."""
-    cart, _ = Cart.objects.get_or_create(user=request.user)
-    return CartSerializer(cart).data
+    """Retrieve the user's cart."""
+    return cart_data(request.user)
 
 
 def add_to_cart(request, serializer):
-    """Add a product to the user's cart."""
+    """Add a quantity of a product to the user's cart."""
     cart, _ = Cart.objects.get_or_create(user=request.user)
     product_slug = serializer.validated_data['product_slug']
-    product = Product.objects.get(slug=product_slug)
-    cart.products.add(product)
-    return CartSerializer(cart).data
+    product_id = Product.objects.filter(slug=product_slug).values_list('pk', flat=True).get()
+    with transaction.atomic():
+        upsert_cart_items(cart.pk, {product_id: serializer.validated_data['quantity']})
+        publish_event(CartChanged(user_id=request.user.pk, product_id=product_id, added=True))
+    return cart_data(request.user)
 
 
 def remove_from_cart(request, serializer):
     """Remove a product from the user's cart, if it exists."""
     product_slug = serializer.validated_data['product_slug']
-    product = Product.objects.get(slug=product_slug)
-    cart, _ = Cart.objects.get_or_create(user=request.user)
+    with transaction.atomic():
+        product_id = Product.objects.filter(slug=product_slug).values_list('pk', flat=True).get()
+        removed, _ = CartItem.objects.filter(cart__user=request.user, product_id=product_id).delete()
+        if removed:
+            Cart.objects.filter(user=request.user).update(version=F('version') + 1, updated_at=Now())
+            publish_event(CartChanged(user_id=request.user.pk, product_id=product_id, added=False))
+    return cart_data(request.user)
+
+
+def read_guest_cart(request):
+    """Return the guest cart from its signed cookie as {product id: quantity}."""
+    value = request.get_signed_cookie(
+        GUEST_CART_COOKIE, default='', salt=GUEST_CART_SALT, max_age=settings.GUEST_CART_COOKIE_AGE
+    )
+    items = {}
+    for line in value.split(','):
+        product_id, _, quantity = line.partition(':')
+        if product_id.isdigit() and quantity.isdigit():
+            items[int(product_id)] = int(quantity)
+    return items
+
+
+def write_guest_cart(response, items):
+    """Store the guest cart in a compact signed cookie, or drop the cookie when it is empty."""
+    if not items:
+        response.delete_cookie(GUEST_CART_COOKIE)
+        return
+    response.set_signed_cookie(
+        GUEST_CART_COOKIE,
+        ','.join(f'{product_id}:{quantity}' for product_id, quantity in items.items()),
+        salt=GUEST_CART_SALT,
+        max_age=settings.GUEST_CART_COOKIE_AGE,
+        httponly=True,
+        samesite='Lax'
+    )
+
+
+def guest_cart_data(items):
+    """Return the guest cart lines in the same shape as a persistent cart."""
+    products = Product.objects.only('slug', 'name', 'price').in_bulk(list(items))
+    lines = []
+    for product_id, quantity in items.items():
+        if product_id in products:
+            line = CartItem(product=products[product_id], quantity=quantity)
+            line.line_total = line.product.price * quantity
+            lines.append(line)
+    total = sum((line.line_total for line in lines), Decimal('0.00'))
+    return CartSerializer({'items': lines, 'total': total}).data
+
+
+def add_to_guest_cart(request, serializer):
+    """Add a quantity of a product to the guest cart without touching the database."""
+    items = read_guest_cart(request)
+    product_id = Product.objects.filter(slug=serializer.validated_data['product_slug']).values_list('pk', flat=True).get()
+    if product_id not in items and len(items) >= settings.GUEST_CART_MAX_ITEMS:
+        raise serializers.ValidationError({'product_slug': 'The cart is full, log in to add more products.'})
+    items[product_id] = items.get(product_id, 0) + serializer.validated_data['quantity']
+    return items
+
+
+def remove_from_guest_cart(request, serializer):
+    """Remove a product from the guest cart, if it is there."""
+    items = read_guest_cart(request)
+    product_id = Product.objects.filter(slug=serializer.validated_data['product_slug']).values_list('pk', flat=True).get()
+    items.pop(product_id, None)
+    return items
+
+
+def merge_guest_cart_service(request, response, user):
+    """Move the guest cart into the user's cart with one upsert and drop the cookie.
+
+    The user's reads are pinned to the primary afterwards, so the first
+    cart view does not miss the merged items on a lagging replica.
+    """
+    items = read_guest_cart(request)
+    if not items:
+        return
+    product_ids = set(Product.objects.filter(pk__in=list(items)).values_list('pk', flat=True))
+    items = {product_id: quantity for product_id, quantity in items.items() if product_id in product_ids}
+    if items:
+        cart, _ = Cart.objects.get_or_create(user=user)
+        with transaction.atomic():
+            upsert_cart_items(cart.pk, items)
+            publish_events([
+                CartChanged(user_id=user.pk, product_id=product_id, added=True) for product_id in items
+            ])
+        mark_recent_write(user)
+    write_guest_cart(response, {})
+
+
+def drain_outbox_service(batch_size=None):
+    """Dispatch a batch of pending outbox events and return how many succeeded.
+
+    Events are marked processed only after all their handlers succeed;
+    failed events are retried by later batches up to OUTBOX_MAX_ATTEMPTS.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    processed, failed = [], []
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+            .order_by('id')[:batch_size]
+        )
+        for event in events:
+            try:
+                with transaction.atomic():
+                    dispatch_event(event)
+            except Exception:
+                logger.exception(f'Outbox event {event.pk} ({event.event_type}) failed')
+                failed.append(event.pk)
+                if event.attempts + 1 >= settings.OUTBOX_MAX_ATTEMPTS:
+                    logger.error(
+                        f'Outbox event {event.pk} ({event.event_type}) is dead after {event.attempts + 1} attempts'
+                    )
+            else:
+                processed.append(event.pk)
+        OutboxEvent.objects.filter(pk__in=processed).update(processed_at=timezone.now())
+        OutboxEvent.objects.filter(pk__in=failed).update(attempts=F('attempts') + 1)
+    record_outbox_metrics_service(len(processed), len(failed))
+    return len(processed)
+
+
+def record_outbox_metrics_service(processed, failed):
+    """Store delivery counters, the number of dead events and the age of the oldest pending event.
+
+    Dead events, which used up OUTBOX_MAX_ATTEMPTS, are not counted in
+    the lag, since no drain will pick them up again.
+    """
+    store = get_key_store()
+    if processed:
+        store.incr('outbox:processed', processed)
+    if failed:
+        store.incr('outbox:failed', failed)
+    unprocessed = OutboxEvent.objects.filter(processed_at__isnull=True)
+    oldest = (
+        unprocessed.filter(attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+        .order_by('id').values_list('created_at', flat=True).first()
+    )
+    lag = (timezone.now() - oldest).total_seconds() if oldest else 0
+    store.set('outbox:lag-seconds', round(lag, 3))
+    store.set('outbox:dead', unprocessed.filter(attempts__gte=settings.OUTBOX_MAX_ATTEMPTS).count())
+    if lag > settings.OUTBOX_LAG_WARNING_SECONDS:
+        logger.warning(f'Outbox lag is {lag:.1f} seconds')
+
+
+def outbox_metrics_service():
+    """Return the outbox delivery counters, dead events and lag."""
+    store = get_key_store()
+    return {
+        'processed': int(store.get('outbox:processed') or 0),
+        'failed': int(store.get('outbox:failed') or 0),
+        'dead': int(store.get('outbox:dead') or 0),
+        'lag_seconds': float(store.get('outbox:lag-seconds') or 0),
+    }
+
+
+def requeue_outbox_service(event_ids=None):
+    """Give dead events, or only the given ones, a fresh set of attempts and return their number."""
+    events = OutboxEvent.objects.filter(processed_at__isnull=True, attempts__gte=settings.OUTBOX_MAX_ATTEMPTS)
+    if event_ids is not None:
+        events = events.filter(pk__in=event_ids)
+    return events.update(attempts=0)
+
+
+def purge_outbox_service():
+    """Delete processed events older than OUTBOX_RETENTION and dead ones older than OUTBOX_DEAD_RETENTION."""
+    now = timezone.now()
+    deleted, _ = OutboxEvent.objects.filter(
+        Q(processed_at__lt=now - settings.OUTBOX_RETENTION)
+        | Q(
+            processed_at__isnull=True,
+            attempts__gte=settings.OUTBOX_MAX_ATTEMPTS,
+            created_at__lt=now - settings.OUTBOX_DEAD_RETENTION,
+        )
+    ).delete()
+    return deleted
+
+
+def record_product_view_service(product, user):
+    """Count a product view in the key store without touching the database."""
+    pipeline = get_key_store().pipeline()
+    pipeline.incr(f'views:count:{product.pk}')
+    pipeline.pfadd(f'views:unique:{product.pk}', user.pk)
+    pipeline.sadd('views:dirty', product.pk)
+    pipeline.execute()
+
+
+def flush_product_views(store, product_ids):
+    """Add the buffered views of the products to the database and return the flushed views.
+
+    View counters are lowered by the flushed amounts only after the
+    UPDATE commits, so a failed flush loses no views.
+    """
+    pipeline = store.pipeline()
+    for product_id in product_ids:
+        pipeline.get(f'views:count:{product_id}')
+        pipeline.pfcount(f'views:unique:{product_id}')
+    results = pipeline.execute()
+    views = {product_id: int(results[index * 2] or 0) for index, product_id in enumerate(product_ids)}
+    unique_viewers = {product_id: results[index * 2 + 1] for index, product_id in enumerate(product_ids)}
+    Product.objects.filter(pk__in=product_ids).update(
+        view_count=F('view_count') + Case(
+            *[When(pk=product_id, then=Value(count)) for product_id, count in views.items()],
+            default=Value(0),
+            output_field=PositiveBigIntegerField()
+        ),
+        unique_viewers=Case(
+            *[When(pk=product_id, then=Value(count)) for product_id, count in unique_viewers.items()],
+            default=F('unique_viewers'),
+            output_field=PositiveBigIntegerField()
+        ),
+    )
+    pipeline = store.pipeline()
+    for product_id, count in views.items():
+        if count:
+            pipeline.incr(f'views:count:{product_id}', -count)
+    pipeline.execute()
+    return sum(views.values())
+
+
+def flush_product_views_service(batch_size=1000):
+    """Move buffered view counts to products with one bulk UPDATE per batch.
+
+    Returns the number of flushed views.
+    """
+    store = get_key_store()
+    flushed = 0
+    while True:
+        product_ids = [int(product_id) for product_id in store.spop('views:dirty', batch_size)]
+        if not product_ids:
+            return flushed
+        try:
+            flushed += flush_product_views(store, product_ids)
+        except Exception:
+            # View counters are untouched, so the products are flushed again next time.
+            store.sadd('views:dirty', *product_ids)
+            raise
+
+
+def reserve_stock_service(product, quantity):
+    """Reserve units of a product and return whether there was enough stock.
+
+    The database path is a single conditional UPDATE, so concurrent buyers
+    never oversell and never hold a row lock longer than that statement.
+    """
+    if product.hot_stock:
+        return reserve_hot_stock(product.pk, quantity)
+    return bool(
+        Product.objects.filter(pk=product.pk, stock__gte=quantity)
+        .update(stock=F('stock') - quantity, version=F('version') + 1, updated_at=Now())
+    )
+
+
+def reserve_hot_stock(product_id, quantity):
+    """Reserve stock of a hot product through the key store counter.
+
+    The counter is seeded from the database once; reservations are added
+    to a pending counter that flush_stock_reservations_service writes back.
+    """
+    store = get_key_store()
+    key = f'stock:available:{product_id}'
+    if store.get(key) is None:
+        # Pending is read before stock. A flush lowers pending only after its stock UPDATE commits,
+        # so a concurrent flush can make the seed count sold units twice, but never zero times.
+        pending = int(store.get(f'stock:pending:{product_id}') or 0)
+        stock = Product.objects.filter(pk=product_id).values_list('stock', flat=True).first() or 0
+        store.set(key, max(stock - pending, 0), nx=True)
+    if store.incr(key, -quantity) < 0:
+        store.incr(key, quantity)
+        return False
+    pipeline = store.pipeline()
+    pipeline.incr(f'stock:pending:{product_id}', quantity)
+    pipeline.sadd('stock:dirty', product_id)
+    pipeline.execute()
+    return True
+
+
+def reset_stock_counter_service(product_id):
+    """Drop the key store counter of a hot product after its stock was set directly.
+
+    Reservations not flushed yet are sold units, so they are subtracted
+    from the new stock first. The counter is seeded again on the next
+    reservation.
+    """
+    store = get_key_store()
+    flush_stock_reservations(store, [product_id])
+    store.delete(f'stock:available:{product_id}')
+
+
+def flush_stock_reservations(store, product_ids):
+    """Subtract the pending reservations of the products from stock and return the flushed units.
+
+    Pending counters are lowered by the flushed amounts only after the
+    UPDATE commits, so reservations are never missing from both the
+    database and the key store.
+    """
+    pipeline = store.pipeline()
+    for product_id in product_ids:
+        pipeline.get(f'stock:pending:{product_id}')
+    reserved = {
+        product_id: int(count)
+        for product_id, count in zip(product_ids, pipeline.execute()) if count and int(count)
+    }
+    if not reserved:
+        return 0
+    with transaction.atomic():
+        Product.objects.filter(pk__in=list(reserved)).update(
+            stock=Greatest(
+                F('stock') - Case(
+                    *[When(pk=product_id, then=Value(count)) for product_id, count in reserved.items()],
+                    default=Value(0),
+                    output_field=PositiveBigIntegerField()
+                ),
+                Value(0),
+            ),
+            version=F('version') + 1,
+            updated_at=Now(),
+        )
+    pipeline = store.pipeline()
+    for product_id, count in reserved.items():
+        pipeline.incr(f'stock:pending:{product_id}', -count)
+    pipeline.execute()
+    return sum(reserved.values())
+
+
+def flush_stock_reservations_service(batch_size=1000):
+    """Subtract pending hot-product reservations from stock in the database.
+
+    Returns the number of flushed units.
+    """
+    store = get_key_store()
+    flushed = 0
+    while True:
+        product_ids = [int(product_id) for product_id in store.spop('stock:dirty', batch_size)]
+        if not product_ids:
+            return flushed
+        try:
+            flushed += flush_stock_reservations(store, product_ids)
+        except Exception:
+            # Pending counters are untouched, so the products are flushed again next time.
+            store.sadd('stock:dirty', *product_ids)
+            raise
+
+
+def author_statistics_service(username):
+    """Return cached statistics of an author's products, or None for unknown authors.
+
+    On a miss everything is computed in one query with grouped subqueries.
+    """
+    key = f'author-stats:{username}'
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    recent = timezone.now() - timedelta(days=settings.AUTHOR_STATS_RECENT_DAYS)
+    products = Product.objects.filter(author=OuterRef('pk')).order_by().values('author')
+    comments = Comment.objects.filter(product__author=OuterRef('pk')).order_by().values('product__author')
+    data = (
+        CustomUser.objects.filter(username=username)
+        .annotate(
+            product_count=Coalesce(Subquery(products.annotate(value=Count('pk')).values('value')), 0),
+            total_comments=Coalesce(Subquery(comments.annotate(value=Count('pk')).values('value')), 0),
+            recent_comments=Coalesce(Subquery(
+                comments.annotate(value=Count('pk', filter=Q(created_at__gte=recent))).values('value')
+            ), 0),
+            average_rating=Subquery(comments.annotate(value=Round(Avg('rating'), 1)).values('value')),
+            last_comment_at=Subquery(comments.annotate(value=Max('created_at')).values('value')),
+        )
+        .values('username', 'product_count', 'total_comments', 'recent_comments', 'average_rating', 'last_comment_at')
+        .first()
+    )
+    if data is not None:
+        cache.set(key, data, settings.AUTHOR_STATS_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_author_statistics_service(author_id):
+    """Drop the cached statistics of an author."""
+    username = CustomUser.objects.filter(pk=author_id).values_list('username', flat=True).first()
+    if username is not None:
+        cache.delete(f'author-stats:{username}')
+
+
+def hot_product_ids_service(by='views', limit=None, slugs=None):
+    """Return the ids of the given products, or of the top products by views or rating."""
+    if slugs:
+        return list(Product.objects.filter(slug__in=slugs).order_by('pk').values_list('pk', flat=True))
+    ordering = {'views': '-view_count', 'rating': '-rating'}[by]
+    products = Product.objects.order_by(ordering, '-id').values_list('pk', flat=True)
+    return list(products[:limit or settings.CACHE_WARM_LIMIT])
+
+
+def warm_products(product_ids):
+    """Encode the products' list fragments and compute their authors' statistics."""
+    product_fragments(list(Product.objects.only('id', 'version').filter(pk__in=product_ids)))
+    authors = CustomUser.objects.filter(products__pk__in=product_ids).distinct().values_list('username', flat=True)
+    for username in authors:
+        author_statistics_service(username)
+    return len(product_ids)
+
+
+def warm_products_in_thread(product_ids):
+    try:
+        return warm_products(product_ids)
+    finally:
+        # Worker threads open their own connections, which must not outlive the warm-up.
+        connections.close_all()
 
-    if cart.products.filter(id=product.id).exists():
-        cart.products.remove(product)
 
-    return CartSerializer(cart).data
+def warm_cache_service(product_ids, concurrency=None, batch_size=None, progress=None):
+    """Pre-populate the caches read by product pages after a deploy or a cache flush.
 
+    Products are warmed in batches on at most ``concurrency`` threads, so
+    at most that many database connections are busy at once. ``progress``
+    is called with the numbers of warmed and all products after each batch.
+    With a concurrency of 1 everything runs in the calling thread.
+    Returns the number of warmed products.
+    """
+    concurrency = concurrency or settings.CACHE_WARM_CONCURRENCY
+    batch_size = batch_size or settings.CACHE_WARM_BATCH_SIZE
+    for alias in ['default', *settings.DATABASE_REPLICAS]:
+        estimated_count(Product.objects.using(alias).all())
+        estimated_count(Comment.objects.using(alias).all())
 
+    batches = [product_ids[start:start + batch_size] for start in range(0, len(product_ids), batch_size)]
+    warmed = 0
+    executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+    with executor or nullcontext():
+        results = executor.map(warm_products_in_thread, batches) if executor else map(warm_products, batches)
+        for count in results:
+            warmed += count
+            if progress is not None:
+                progress(warmed, len(product_ids))
+    return warmed
@@ -0,0 +1,80 @@
+from django.conf import settings
+
+from MySite.celery import app
+
+from .services import (
+    drain_outbox_service,
+    flush_product_views_service,
+    flush_stock_reservations_service,
+    purge_outbox_service,
+    recompute_product_rating_service,
+    reconcile_product_ratings_service,
+    hot_product_ids_service,
+    warm_cache_service
+)
+
+
+@app.task
+def drain_outbox(max_batches=10):
+    """Dispatch pending outbox events in batches until the outbox is empty."""
+    for _ in range(max_batches):
+        if not drain_outbox_service():
+            break
+
+
+@app.task
+def purge_outbox():
+    """Delete old processed outbox events."""
+    return purge_outbox_service()
+
+
+@app.task
+def recompute_product_rating(product_id):
+    """Recalculate the rating of a product after a burst of comments."""
+    recompute_product_rating_service(product_id)
+
+
+@app.task
+def reconcile_product_ratings():
+    """Recalculate drifted ratings across the whole product table."""
+    return reconcile_product_ratings_service()
+
+
+@app.task
+def flush_product_views():
+    """Write buffered product view counts to the database."""
+    return flush_product_views_service()
+
+
+@app.task
+def flush_stock_reservations():
+    """Write pending hot-product reservations to the database."""
+    return flush_stock_reservations_service()
+
+
+@app.task
+def build_cart_recommendations():
+    """Rebuild "frequently carted together" recommendations."""
+    # NumPy is only needed by this offline job, so workers import it on first run.
+    from .recommendations import build_cart_recommendations as build
+    return build(k=settings.RECOMMENDATIONS_TOP_K)
+
+
+@app.task
+def build_similar_products():
+    """Rebuild content vectors and "similar products" for the whole catalog."""
+    from .recommendations import build_similar_products as build
+    return build(k=settings.RECOMMENDATIONS_TOP_K, dimensions=settings.SIMILAR_PRODUCTS_DIMENSIONS)
+
+
+@app.task
+def add_similar_products():
+    """Add new and changed products to the "similar products" index."""
+    from .recommendations import add_similar_products as add
+    return add(k=settings.RECOMMENDATIONS_TOP_K, dimensions=settings.SIMILAR_PRODUCTS_DIMENSIONS)
+
+
+@app.task
+def warm_cache(by='views', limit=None, slugs=None):
+    """Warm the caches of the hottest products, meant to be sent once after a deploy."""
+    return warm_cache_service(hot_product_ids_service(by=by, limit=limit, slugs=slugs))
@@ -1,9 +1,44 @@
+import asyncio
+import threading
+from datetime import timedelta
+from contextlib import contextmanager
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from .models import Product, Comment
+from .events import CommentCreated, ProductCreated, handles, _handlers
+from .fragments import get_fragment_cache
+from .handlers import push_comment
+from .live import InMemoryBroadcast, get_broadcast
+from .models import Product, Comment, Cart, OutboxEvent, ProductRecommendation, ProductVector
+from .pagination import estimated_count
+from .serializers import ProductSerializer
+from .recommendations import build_cart_recommendations, build_similar_products, add_similar_products
+from .services import (
+    drain_outbox_service,
+    outbox_metrics_service,
+    purge_outbox_service,
+    update_product_rating,
+    flush_product_views_service,
+    flush_stock_reservations_service,
+    reserve_stock_service,
+    reconcile_product_ratings_service,
+    recompute_product_rating_service,
+    hot_product_ids_service
+)
+from account.backends import get_key_store
 from account.models import CustomUser
+from asgiref.sync import sync_to_async
 from knox.models import AuthToken
 
 
@@ -129,14 +164,15 @@ class CartAPITests(APITestCase):
         """Test retrieving the cart."""
         response = self.client.get(reverse('api-cart-view'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['products'], [])
+        self.assertEqual(response.data['items'], [])
+        self.assertEqual(response.data['total'], '0.00')
 
     def test_add_product_to_cart(self):
         """Test adding a product to the cart."""
         data = {'product_slug': self.product1.slug}
         response = self.client.post(reverse('api-cart-view'), data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn(self.product1.name, response.data['products'])
+        self.assertIn(self.product1.name, [item['name'] for item in response.data['items']])
 
     def test_remove_product_from_cart(self):
         """Test removing a product from the cart."""
@@ -145,7 +181,24 @@ class CartAPITests(APITestCase):
         data = {'product_slug': self.product1.slug}
         response = self.client.delete(reverse('api-cart-view'), data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertNotIn(self.product1.name, response.data['products'])
+        self.assertNotIn(self.product1.name, [item['name'] for item in response.data['items']])
+
+    def test_add_product_increments_quantity(self):
+        """Test adding a product again increments its quantity and the cart total."""
+        self.client.post(reverse('api-cart-view'), {'product_slug': self.product1.slug})
+        self.client.post(reverse('api-cart-view'), {'product_slug': self.product1.slug, 'quantity': 2})
+        self.client.post(reverse('api-cart-view'), {'product_slug': self.product2.slug})
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+
+        self.client.force_authenticate(self.user)
+        # One lookup of the cart version for conditional GET, one query for the lines and total.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api-cart-view'))
+        self.assertEqual(
+            [(item['slug'], item['quantity'], item['line_total']) for item in response.data['items']],
+            [('product-1', 3, '30.00'), ('product-2', 1, '20.00')]
+        )
+        self.assertEqual(response.data['total'], '50.00')
 
     def test_add_non_existent_product_to_cart(self):
         """Test adding a non-existent product to the cart."""
@@ -159,4 +212,807 @@ class CartAPITests(APITestCase):
         """Test removing a non-existent product from the cart."""
         data = {'product_slug': 'non-existent-slug'}
         response = self.client.delete(reverse('api-cart-view'), data)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class GuestCartTests(APITestCase):
+    """Tests for guest carts kept in signed cookies."""
+
+    def setUp(self):
+        """Set up a user and products."""
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.product1 = Product.objects.create(name='Product 1', price=10, description='Text', author=self.user)
+        self.product2 = Product.objects.create(name='Product 2', price=20, description='Text', author=self.user)
+
+    def test_guest_cart_without_writes(self):
+        """Test a guest can fill a cart without any cart rows being written."""
+        self.client.post(reverse('api-cart-view'), {'product_slug': self.product1.slug, 'quantity': 2})
+        response = self.client.post(reverse('api-cart-view'), {'product_slug': self.product2.slug})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], '40.00')
+        self.assertFalse(Cart.objects.exists())
+
+        response = self.client.get(reverse('api-cart-view'))
+        self.assertEqual([item['quantity'] for item in response.data['items']], [2, 1])
+
+    def test_tampered_cookie_is_ignored(self):
+        """Test a guest cart cookie with a bad signature reads as empty."""
+        self.client.cookies['guest_cart'] = f'{self.product1.pk}:5'
+        response = self.client.get(reverse('api-cart-view'))
+        self.assertEqual(response.data['items'], [])
+
+    def test_merge_on_login(self):
+        """Test logging in merges the guest cart into the persistent cart."""
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('api-cart-view'), {'product_slug': self.product1.slug})
+        self.client.force_authenticate(None)
+        self.client.post(reverse('api-cart-view'), {'product_slug': self.product1.slug, 'quantity': 2})
+        self.client.post(reverse('api-cart-view'), {'product_slug': self.product2.slug})
+
+        response = self.client.post(reverse('api-login'), {'username': 'testuser', 'password': 'testpassword'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.cookies['guest_cart'].value, '')
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('api-cart-view'))
+        self.assertEqual(
+            [(item['slug'], item['quantity']) for item in response.data['items']],
+            [(self.product1.slug, 3), (self.product2.slug, 1)]
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITestCase):
+    """Tests for sending GET reads to the replica database."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        """Create the same user on both databases with different products."""
+        for alias in ('default', 'replica'):
+            user = CustomUser.objects.db_manager(alias).create_user(username='testuser', password='testpassword')
+            Product.objects.using(alias).create(name=f'{alias} product', price=10, description='Text', author=user)
+        self.user = CustomUser.objects.get(username='testuser')
+        self.token = AuthToken.objects.create(user=self.user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        get_key_store().flushdb()
+
+    def test_get_reads_from_replica(self):
+        """Test GET requests read from the replica."""
+        response = self.client.get(reverse('api-product-list-create'))
+        self.assertEqual([product['name'] for product in response.data['results']], ['replica product'])
+
+    def test_reads_own_writes(self):
+        """Test a user reads from the primary right after a write."""
+        self.client.post(reverse('api-product-list-create'), {
+            'name': 'New Product',
+            'price': 150.00,
+            'description': 'Text'
+        })
+        response = self.client.get(reverse('api-product-list-create'))
+        self.assertEqual(
+            [product['name'] for product in response.data['results']],
+            ['default product', 'New Product']
+        )
+
+    def test_reads_merged_guest_cart(self):
+        """Test the first cart view after login reads the merged guest cart from the primary."""
+        self.client.credentials()
+        product = Product.objects.get(name='default product')
+        self.client.post(reverse('api-cart-view'), {'product_slug': product.slug})
+        response = self.client.post(reverse('api-login'), {'username': 'testuser', 'password': 'testpassword'})
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+        response = self.client.get(reverse('api-cart-view'))
+        self.assertEqual([item['slug'] for item in response.data['items']], [product.slug])
+
+
+
+class OutboxTests(APITestCase):
+    """Tests for the transactional outbox."""
+
+    def setUp(self):
+        """Set up a user, a product and a handler recording comment events."""
+        get_key_store().flushdb()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.token = AuthToken.objects.create(user=self.user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.product = Product.objects.create(name='Test Product', price=100, description='Text', author=self.user)
+        self.received = []
+        handles(CommentCreated)(self.received.append)
+        self.addCleanup(_handlers[CommentCreated].remove, self.received.append)
+
+    def test_write_and_event_are_stored_together(self):
+        """Test creating a comment stores its event in the outbox."""
+        self.client.post(reverse('api-product-comments', kwargs={'slug': self.product.slug}), {'rating': 5})
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.event_type, 'CommentCreated')
+        self.assertEqual(event.payload['product_id'], self.product.pk)
+
+    def test_drain_dispatches_to_handlers(self):
+        """Test draining delivers typed events and marks them processed."""
+        self.client.post(reverse('api-product-comments', kwargs={'slug': self.product.slug}), {'rating': 5})
+        self.assertEqual(drain_outbox_service(), 1)
+        self.assertEqual(self.received, [CommentCreated(
+            comment_id=Comment.objects.get().pk, product_id=self.product.pk, author_id=self.user.pk
+        )])
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(outbox_metrics_service()['processed'], 1)
+
+    def test_failed_event_is_retried(self):
+        """Test an event stays pending when a handler fails."""
+        def failing_handler(event):
+            raise RuntimeError('Handler failed')
+
+        handles(ProductCreated)(failing_handler)
+        self.addCleanup(_handlers[ProductCreated].remove, failing_handler)
+        self.client.post(reverse('api-product-list-create'), {
+            'name': 'New Product', 'price': 150.00, 'description': 'Text'
+        })
+        self.assertEqual(drain_outbox_service(), 0)
+        event = OutboxEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(outbox_metrics_service()['failed'], 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_dead_event(self):
+        """Test dead events are left out of the lag, counted, requeued and purged."""
+        def failing_handler(event):
+            raise RuntimeError('Handler failed')
+
+        handles(ProductCreated)(failing_handler)
+        self.addCleanup(_handlers[ProductCreated].remove, failing_handler)
+        self.client.post(reverse('api-product-list-create'), {
+            'name': 'New Product', 'price': 150.00, 'description': 'Text'
+        })
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(days=1))
+        drain_outbox_service()
+        self.assertEqual(outbox_metrics_service()['dead'], 1)
+        self.assertEqual(outbox_metrics_service()['lag_seconds'], 0)
+
+        call_command('requeue_outbox', stdout=StringIO())
+        drain_outbox_service()
+        self.assertEqual(OutboxEvent.objects.get().attempts, 1)
+
+        self.assertEqual(purge_outbox_service(), 0)
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(purge_outbox_service(), 1)
+
+
+
+class ProductRatingTests(APITestCase):
+    """Tests for debounced rating recalculation."""
+
+    def setUp(self):
+        """Set up a user and a product."""
+        get_key_store().flushdb()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.token = AuthToken.objects.create(user=self.user)[1]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.product = Product.objects.create(name='Test Product', price=100, description='Text', author=self.user)
+
+    def test_update_product_rating(self):
+        """Test the rating is the rounded average of comment ratings."""
+        for rating in (5, 4, 4):
+            Comment.objects.create(product=self.product, author=self.user, rating=rating)
+        update_product_rating(self.product.pk)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating, Decimal('4.3'))
+
+    @patch('shop.tasks.recompute_product_rating.apply_async')
+    def test_comment_burst_schedules_one_recalculation(self, mock_apply_async):
+        """Test a burst of comments schedules a single recalculation."""
+        url = reverse('api-product-comments', kwargs={'slug': self.product.slug})
+        for rating in (5, 3, 1):
+            self.client.post(url, {'rating': rating})
+        drain_outbox_service()
+        mock_apply_async.assert_called_once_with((self.product.pk,), countdown=10)
+
+    def test_reconcile_fixes_drift(self):
+        """Test reconciliation corrects only drifted products."""
+        Comment.objects.create(product=self.product, author=self.user, rating=2)
+        Product.objects.create(name='Other Product', price=100, description='Text', author=self.user)
+        self.assertEqual(reconcile_product_ratings_service(chunk_size=1), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating, Decimal('2.0'))
+        self.assertEqual(reconcile_product_ratings_service(), 0)
+
+
+
+class LiveUpdateTests(APITestCase):
+    """Tests for live product updates over server-sent events."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.token = AuthToken.objects.create(user=self.user)[1]
+        self.product = Product.objects.create(name='Test Product', price=100, description='Text', author=self.user)
+        self.url = reverse('api-product-live', kwargs={'slug': self.product.slug})
+
+    def test_broadcast_fan_out(self):
+        """Test a message published from another thread reaches every subscriber of the channel."""
+        broadcast = InMemoryBroadcast()
+
+        async def receive():
+            subscribers = [broadcast.subscribe('product:1', heartbeat=0.05) for _ in range(3)]
+            first = [asyncio.ensure_future(anext(subscriber)) for subscriber in subscribers]
+            await asyncio.sleep(0)
+            thread = threading.Thread(target=broadcast.publish, args=('product:1', b'message'))
+            thread.start()
+            thread.join()
+            received = await asyncio.gather(*first)
+            heartbeat = await anext(subscribers[0])
+            for subscriber in subscribers:
+                await subscriber.aclose()
+            return received, heartbeat
+
+        received, heartbeat = asyncio.run(receive())
+        self.assertEqual(received, [b'message'] * 3)
+        self.assertIsNone(heartbeat)
+        self.assertFalse(broadcast._subscribers)
+
+    async def test_stream(self):
+        """Test new comments and ratings are pushed to the product's stream."""
+        response = await self.async_client.get(self.url, headers={'Authorization': f'Token {self.token}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        next_message = asyncio.ensure_future(anext(stream))
+        while not get_broadcast()._subscribers:
+            await asyncio.sleep(0.01)
+
+        comment = await Comment.objects.acreate(product=self.product, author=self.user, rating=4, text='Nice')
+        await sync_to_async(self.push_comment)(comment)
+        message = await next_message
+        self.assertTrue(message.startswith(b'event: comment\ndata: {"id":%d,' % comment.pk))
+        self.assertIn(b'"text":"Nice"', message)
+
+        await sync_to_async(recompute_product_rating_service)(self.product.pk)
+        self.assertEqual(await anext(stream), b'event: rating\ndata: {"rating":"4.0"}\n\n')
+        await stream.aclose()
+
+    def push_comment(self, comment):
+        with self.captureOnCommitCallbacks(execute=True):
+            push_comment(CommentCreated(comment_id=comment.pk, product_id=self.product.pk, author_id=self.user.pk))
+
+    @patch('shop.handlers.publish_product_event')
+    def test_failed_event_is_not_pushed(self, mock_publish):
+        """Test a comment is pushed only when all handlers of its event succeed."""
+        def failing_handler(event):
+            raise RuntimeError('Handler failed')
+
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('api-product-comments', kwargs={'slug': self.product.slug}), {'rating': 5})
+        handles(CommentCreated)(failing_handler)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(drain_outbox_service(), 0)
+        finally:
+            _handlers[CommentCreated].remove(failing_handler)
+        mock_publish.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(drain_outbox_service(), 1)
+        mock_publish.assert_called_once()
+
+    def test_stream_requires_token(self):
+        """Test streams need a valid token, given in the header or the query string."""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get(self.url, {'token': 'invalid'}).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(reverse('api-product-live', kwargs={'slug': 'missing'}), {'token': self.token})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class WarmCacheTests(APITestCase):
+    """Tests for the post-deploy cache warm-up."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.popular = Product.objects.create(name='Popular Product', price=100, author=self.user, view_count=10)
+        self.rated = Product.objects.create(name='Rated Product', price=100, author=self.user, rating=5)
+        self.other = Product.objects.create(name='Other Product', price=100, author=self.user)
+
+    def test_hot_product_ids(self):
+        """Test hot products are picked by views, by rating or by slug."""
+        self.assertEqual(hot_product_ids_service(limit=1), [self.popular.pk])
+        self.assertEqual(hot_product_ids_service(by='rating', limit=1), [self.rated.pk])
+        self.assertEqual(hot_product_ids_service(slugs=[self.other.slug]), [self.other.pk])
+
+    @override_settings(PRODUCT_FRAGMENT_CACHE_SIZE=100)
+    def test_warm_cache_command(self):
+        """Test the command warms fragments and author statistics batch by batch."""
+        stdout = StringIO()
+        call_command('warm_cache', '--limit=2', '--batch-size=1', '--concurrency=1', stdout=stdout, stderr=StringIO())
+        self.assertIn('Warmed 1/2 products', stdout.getvalue())
+        self.assertIn('Cache warmed for 2 products', stdout.getvalue())
+        self.assertEqual(len(get_fragment_cache().get_many([
+            f'product:{product.pk}:{product.version}' for product in (self.popular, self.rated, self.other)
+        ])), 2)
+        self.assertIsNotNone(cache.get('author-stats:testuser'))
+
+
+class ProductViewCounterTests(APITestCase):
+    """Tests for buffered product view counters."""
+
+    def setUp(self):
+        """Set up two users and two products."""
+        get_key_store().flushdb()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.other_user = CustomUser.objects.create_user(username='otheruser', password='testpassword')
+        self.product = Product.objects.create(name='Test Product', price=100, description='Text', author=self.user)
+        self.other_product = Product.objects.create(name='Other Product', price=100, description='Text', author=self.user)
+
+    def view(self, user, product, times=1):
+        self.client.force_authenticate(user)
+        for _ in range(times):
+            self.client.get(reverse('api-product-detail', kwargs={'slug': product.slug}))
+
+    def test_views_are_buffered_and_flushed(self):
+        """Test views are counted without writes and flushed in bulk."""
+        self.view(self.user, self.product, times=3)
+        self.view(self.other_user, self.product)
+        self.view(self.user, self.other_product)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.view_count, 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_product_views_service(), 5)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.view_count, self.product.unique_viewers), (4, 2))
+        self.other_product.refresh_from_db()
+        self.assertEqual((self.other_product.view_count, self.other_product.unique_viewers), (1, 1))
+
+    def test_failed_flush_keeps_views(self):
+        """Test views of a flush whose UPDATE fails are flushed by the next one."""
+        self.view(self.user, self.product, times=3)
+        with patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_product_views_service()
+        self.assertEqual(flush_product_views_service(), 3)
+        self.assertEqual(flush_product_views_service(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.view_count, 3)
+
+    def test_popular_ordering(self):
+        """Test the product list can be ordered by flushed view counts."""
+        self.view(self.user, self.other_product, times=2)
+        flush_product_views_service()
+        response = self.client.get(reverse('api-product-list-create'), {'ordering': 'popular'})
+        self.assertEqual(
+            [product['name'] for product in response.data['results']],
+            ['Other Product', 'Test Product']
+        )
+
+
+
+@override_settings(PRODUCT_FRAGMENT_CACHE_SIZE=100)
+class ProductFragmentTests(APITestCase):
+    """Tests for the encoded product fragment cache."""
+
+    def setUp(self):
+        """Set up products."""
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f'Product {i}', price=10, description='Text', author=self.user)
+            for i in range(3)
+        ]
+        self.url = reverse('api-product-list-create')
+
+    def test_cached_fragments_are_reused(self):
+        """Test a repeated page encodes nothing and matches the serializer output."""
+        first = self.client.get(self.url)
+        with self.assertNumQueries(2):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second.json()['results'], ProductSerializer(self.products, many=True).data)
+        self.assertEqual(second.json()['count'], 3)
+
+    def test_changed_product_is_encoded_again(self):
+        """Test an updated product gets a new fragment."""
+        self.client.get(self.url)
+        self.client.patch(reverse('api-product-detail', kwargs={'slug': self.products[1].slug}), {'price': 25})
+        response = self.client.get(self.url)
+        self.assertEqual([product['price'] for product in response.json()['results']], ['10.00', '25.00', '10.00'])
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.product = Product.objects.create(
+            name='Test Product', price=100, description='A long description.', author=self.user
+        )
+        self.client.force_authenticate(self.user)
+
+    def product_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query['sql'] for query in queries if 'shop_product' in query['sql']]
+
+    def test_detail_fields(self):
+        """Test ?fields= trims the product and skips unused columns and the author join."""
+        url = reverse('api-product-detail', args=[self.product.slug])
+        response, queries = self.product_queries(url + '?fields=name,slug,price')
+        self.assertEqual(list(response.data), ['slug', 'name', 'price'])
+        self.assertNotIn('description', queries[0])
+        self.assertNotIn('JOIN', queries[0])
+
+        response, queries = self.product_queries(url + '?fields=name,author')
+        self.assertEqual(response.data, {'name': 'Test Product', 'author': 'testuser'})
+        self.assertIn('JOIN', queries[0])
+
+    def test_list_fields(self):
+        """Test ?fields= applies to the product list."""
+        response, queries = self.product_queries(reverse('api-product-list-create') + '?fields=slug,price')
+        self.assertEqual(response.data['results'], [{'slug': self.product.slug, 'price': '100.00'}])
+        self.assertFalse(any('description' in query or 'JOIN' in query for query in queries))
+
+    def test_unknown_fields(self):
+        """Test unknown field names are rejected."""
+        response = self.client.get(reverse('api-product-detail', args=[self.product.slug]) + '?fields=name,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalGetTests(APITestCase):
+    """Tests for ETag and Last-Modified support."""
+
+    def setUp(self):
+        """Set up a product and an authenticated user."""
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Test Product', price=10, description='Text', author=self.user)
+
+    def assert_revalidates(self, url, change):
+        """Check a repeated GET gets 304 after one lookup and 200 after the change."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_product_detail(self):
+        """Test the product detail revalidates until the product changes."""
+        self.assert_revalidates(
+            reverse('api-product-detail', kwargs={'slug': self.product.slug}),
+            lambda: self.client.patch(
+                reverse('api-product-detail', kwargs={'slug': self.product.slug}), {'price': 20}
+            )
+        )
+
+    def test_comments(self):
+        """Test the comment list revalidates until a comment is added."""
+        url = reverse('api-product-comments', kwargs={'slug': self.product.slug})
+        self.assert_revalidates(url, lambda: self.client.post(url, {'rating': 5}))
+
+    def test_comments_product_change(self):
+        """Test the comment list revalidates when the product is renamed."""
+        url = reverse('api-product-comments', kwargs={'slug': self.product.slug})
+        self.client.post(url, {'rating': 5})
+        self.assert_revalidates(url, lambda: self.client.patch(
+            reverse('api-product-detail', kwargs={'slug': self.product.slug}), {'name': 'Renamed Product'}
+        ))
+        self.assertEqual(self.client.get(url).data[0]['product'], 'Renamed Product')
+
+    def test_cart(self):
+        """Test the cart revalidates until it changes."""
+        url = reverse('api-cart-view')
+        self.client.post(url, {'product_slug': self.product.slug})
+        self.assert_revalidates(url, lambda: self.client.post(url, {'product_slug': self.product.slug}))
+
+    def test_cart_product_change(self):
+        """Test the cart revalidates when a carted product's price changes or it is deleted."""
+        url = reverse('api-cart-view')
+        other = Product.objects.create(name='Other Product', price=5, description='Text', author=self.user)
+        self.client.post(url, {'product_slug': self.product.slug})
+        self.client.post(url, {'product_slug': other.slug})
+        self.assert_revalidates(url, lambda: self.client.patch(
+            reverse('api-product-detail', kwargs={'slug': self.product.slug}), {'price': 20}
+        ))
+        etag = self.client.get(url)['ETag']
+        other.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], '20.00')
+
+
+@override_settings(APPROXIMATE_COUNT_THRESHOLD=3)
+class ApproximateCountTests(APITestCase):
+    """Tests for estimated counts in pagination and the admin."""
+
+    def setUp(self):
+        """Set up products and comments."""
+        cache.clear()
+        self.user = CustomUser.objects.create_superuser(username='admin', password='testpassword')
+        self.client.force_authenticate(self.user)
+        for i in range(3):
+            product = Product.objects.create(name=f'Product {i}', price=10, description='Text', author=self.user)
+            Comment.objects.create(product=product, author=self.user, rating=5)
+
+    def test_large_table_count_is_cached(self):
+        """Test a table above the threshold reuses its cached count, filtered querysets do not."""
+        self.assertEqual(self.client.get(reverse('api-product-list-create')).data['count'], 3)
+        Product.objects.create(name='Product 3', price=10, description='Text', author=self.user)
+        self.assertEqual(self.client.get(reverse('api-product-list-create')).data['count'], 3)
+        self.assertEqual(estimated_count(Product.objects.filter(price=10)), 4)
+
+    def test_comment_changelist_queries(self):
+        """Test the comment changelist skips COUNT(*) and does not query authors and products per row."""
+        self.client.force_login(self.user)
+        url = reverse('admin:shop_comment_changelist')
+        self.client.get(url)
+        Comment.objects.create(product=Product.objects.first(), author=self.user, rating=4)
+        # Session, user and the page itself; the count comes from the cache.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['cl'].result_list), 4)
+
+
+class StockReservationTests(APITestCase):
+    """Tests for stock reservations."""
+
+    def setUp(self):
+        """Set up a product with limited stock."""
+        get_key_store().flushdb()
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(
+            name='Test Product', price=100, description='Text', author=self.user, stock=3
+        )
+        self.url = reverse('api-product-reserve', kwargs={'slug': self.product.slug})
+
+    def test_reserve_until_sold_out(self):
+        """Test reservations decrement stock and fail once it runs out."""
+        self.assertEqual(self.client.post(self.url, {'quantity': 2}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(self.url, {'quantity': 2}).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.post(self.url, {'quantity': 1}).status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+    def test_hot_stock_is_flushed(self):
+        """Test hot-product reservations go through the key store and reach the database on flush."""
+        Product.objects.filter(pk=self.product.pk).update(hot_stock=True)
+        self.client.post(self.url, {'quantity': 2})
+        self.assertEqual(self.client.post(self.url, {'quantity': 2}).status_code, status.HTTP_409_CONFLICT)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+        self.assertEqual(flush_stock_reservations_service(), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_restock_resets_hot_counter(self):
+        """Test setting stock of a hot product replaces the counter but keeps unflushed sales."""
+        Product.objects.filter(pk=self.product.pk).update(hot_stock=True)
+        self.client.post(self.url, {'quantity': 3})
+        self.client.patch(reverse('api-product-detail', kwargs={'slug': self.product.slug}), {'stock': 5})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertEqual(self.client.post(self.url, {'quantity': 3}).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.post(self.url, {'quantity': 2}).status_code, status.HTTP_200_OK)
+
+    def test_update_keeps_concurrent_reservation(self):
+        """Test a product update does not put back stock reserved after the product was loaded."""
+        from .views import get_object_or_404
+
+        def get_then_reserve(*args, **kwargs):
+            product = get_object_or_404(*args, **kwargs)
+            self.assertTrue(reserve_stock_service(self.product, 3))
+            return product
+
+        with patch('shop.views.get_object_or_404', get_then_reserve):
+            response = self.client.patch(
+                reverse('api-product-detail', kwargs={'slug': self.product.slug}), {'description': 'New text'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(self.product.description, 'New text')
+
+    def test_concurrent_writes_get_distinct_versions(self):
+        """Test saving a product loaded before a reservation does not reuse the reservation's version."""
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertTrue(reserve_stock_service(self.product, 1))
+        product.description = 'New text'
+        product.save(update_fields=['description', 'version', 'updated_at'])
+        self.assertEqual(product.version, 3)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).version, 3)
+
+    def test_reseed_during_flush(self):
+        """Test a counter seeded while a flush is writing stock does not offer sold units again."""
+        Product.objects.filter(pk=self.product.pk).update(hot_stock=True)
+        self.product.refresh_from_db()
+        self.client.post(self.url, {'quantity': 2})
+        get_key_store().delete(f'stock:available:{self.product.pk}')
+        atomic = transaction.atomic
+        results = []
+
+        @contextmanager
+        def reseed_then_atomic():
+            results.append(reserve_stock_service(self.product, 2))
+            with atomic():
+                yield
+
+        with patch('shop.services.transaction.atomic', reseed_then_atomic):
+            self.assertEqual(flush_stock_reservations_service(), 2)
+        self.assertEqual(results, [False])
+        self.assertTrue(reserve_stock_service(self.product, 1))
+
+    def test_reseed_after_flush(self):
+        """Test a counter seeded after a flush does not offer sold units again."""
+        Product.objects.filter(pk=self.product.pk).update(hot_stock=True)
+        self.client.post(self.url, {'quantity': 2})
+        self.assertEqual(flush_stock_reservations_service(), 2)
+        self.assertEqual(flush_stock_reservations_service(), 0)
+        get_key_store().delete(f'stock:available:{self.product.pk}')
+        self.assertEqual(self.client.post(self.url, {'quantity': 2}).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.post(self.url, {'quantity': 1}).status_code, status.HTTP_200_OK)
+
+
+class CartRecommendationTests(APITestCase):
+    """Tests for "frequently carted together" recommendations."""
+
+    def setUp(self):
+        """Set up products and carts of several users."""
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f'Product {index}', price=10, description='Text', author=self.user)
+            for index in range(4)
+        ]
+        carts = [(0, 1, 2), (0, 1), (0, 2), (0, 1, 3), (3,)]
+        for index, product_indexes in enumerate(carts):
+            user = CustomUser.objects.create_user(username=f'buyer{index}', password='testpassword')
+            cart = Cart.objects.create(user=user)
+            cart.products.add(*[self.products[product_index] for product_index in product_indexes])
+
+    def test_build_and_serve(self):
+        """Test neighbors are ranked by co-occurrence counts across cart chunks."""
+        self.assertEqual(build_cart_recommendations(k=2, chunk_size=2), 8)
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('api-product-recommendations', kwargs={'slug': self.products[0].slug})
+            )
+        self.assertEqual(
+            [(item['name'], item['score']) for item in response.data],
+            [('Product 1', 3.0), ('Product 2', 2.0)]
+        )
+
+    def test_rebuild_replaces_recommendations(self):
+        """Test a rebuild replaces previous results."""
+        build_cart_recommendations(k=1)
+        build_cart_recommendations(k=1)
+        response = self.client.get(
+            reverse('api-product-recommendations', kwargs={'slug': self.products[3].slug})
+        )
+        self.assertEqual([item['name'] for item in response.data], ['Product 0'])
+
+
+
+class SimilarProductsTests(APITestCase):
+    """Tests for content-based "similar products"."""
+
+    def setUp(self):
+        """Set up products with overlapping descriptions."""
+        self.user = CustomUser.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(self.user)
+        self.phone = self.create('Smartphone Galaxy', 'Android smartphone with a large screen')
+        self.other_phone = self.create('Smartphone Pixel', 'Android smartphone with a great camera')
+        self.kettle = self.create('Electric kettle', 'Stainless steel kettle for boiling water')
+
+    def create(self, name, description):
+        return Product.objects.create(name=name, price=10, description=description, author=self.user)
+
+    def similar(self, product):
+        response = self.client.get(reverse('api-similar-products', kwargs={'slug': product.slug}))
+        return [item['name'] for item in response.data]
+
+    def test_build_similar_products(self):
+        """Test the most similar product is ranked first."""
+        build_similar_products(k=2, chunk_size=2)
+        self.assertEqual(self.similar(self.phone)[0], 'Smartphone Pixel')
+        self.assertNotIn('Smartphone Galaxy', self.similar(self.phone))
+
+    def test_add_new_product_incrementally(self):
+        """Test a new product is indexed and joins its neighbors' lists."""
+        build_similar_products(k=1)
+        kettle = self.create('Electric kettle Bosch', 'Stainless steel kettle for boiling water fast')
+        self.assertEqual(add_similar_products(k=1), 1)
+        self.assertEqual(self.similar(kettle), ['Electric kettle'])
+        self.assertEqual(self.similar(self.kettle), ['Electric kettle Bosch'])
+        self.assertEqual(self.similar(self.phone), ['Smartphone Pixel'])
+        self.assertEqual(add_similar_products(k=1), 0)
+
+    def test_update_product_incrementally(self):
+        """Test re-indexing updated products matches a full rebuild without duplicate neighbors."""
+        def stored():
+            return sorted(
+                ProductRecommendation.objects.filter(kind=ProductRecommendation.SIMILAR)
+                .values_list('product_id', 'recommended_id', 'rank')
+            )
+
+        build_similar_products(k=2)
+        for description in ('Android smartphone with a large screen', 'Garden hose'):
+            Product.objects.filter(pk=self.other_phone.pk).update(description=description)
+            ProductVector.objects.filter(product_id=self.other_phone.pk).delete()
+            self.assertEqual(add_similar_products(k=2), 1)
+            incremental = stored()
+            build_similar_products(k=2)
+            self.assertEqual(incremental, stored())
+            neighbors = [(product, recommended) for product, recommended, _ in incremental]
+            self.assertEqual(len(neighbors), len(set(neighbors)))
+
+
+
+class AuthorProductListTests(APITestCase):
+    """Tests for the per-author product listing."""
+
+    def setUp(self):
+        """Set up two authors with products."""
+        self.author = CustomUser.objects.create_user(username='seller', password='testpassword')
+        other = CustomUser.objects.create_user(username='other', password='testpassword')
+        self.client.force_authenticate(self.author)
+        for i in range(15):
+            Product.objects.create(name=f'Product {i}', price=10, description='Text', author=self.author)
+        Product.objects.create(name='Other product', price=10, description='Text', author=other)
+
+    def test_pages_through_author_products(self):
+        """Test each page is one query and pages cover all products of the author only."""
+        url = reverse('api-author-products', kwargs={'username': 'seller'})
+        names = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            names += [product['name'] for product in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(names, [f'Product {i}' for i in reversed(range(15))])
+
+
+class AuthorStatisticsTests(APITestCase):
+    """Tests for seller statistics."""
+
+    def setUp(self):
+        """Set up an author with commented products."""
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='seller', password='testpassword')
+        self.buyer = CustomUser.objects.create_user(username='buyer', password='testpassword')
+        self.client.force_authenticate(self.buyer)
+        self.product = Product.objects.create(name='Product 1', price=10, description='Text', author=self.author)
+        Product.objects.create(name='Product 2', price=10, description='Text', author=self.author)
+        for rating in (5, 4):
+            Comment.objects.create(product=self.product, author=self.buyer, rating=rating)
+        self.url = reverse('api-author-stats', kwargs={'username': 'seller'})
+
+    def test_statistics_in_one_query(self):
+        """Test statistics are computed in one query and then cached."""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['product_count'], 2)
+        self.assertEqual(response.data['total_comments'], 2)
+        self.assertEqual(response.data['recent_comments'], 2)
+        self.assertEqual(float(response.data['average_rating']), 4.5)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_comment_invalidates_statistics(self):
+        """Test a new comment on the author's product drops the cached statistics."""
+        self.client.get(self.url)
+        self.client.post(reverse('api-product-comments', kwargs={'slug': self.product.slug}), {'rating': 3})
+        drain_outbox_service()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['total_comments'], 3)
+
+    def test_unknown_author(self):
+        """Test statistics of an unknown author are not found."""
+        response = self.client.get(reverse('api-author-stats', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,10 +1,20 @@
 from django.urls import path
 from . import views
+from .models import ProductRecommendation
 
 
 urlpatterns = [
     path('api-products/', views.ProductListCreateView.as_view(), name='api-product-list-create'),
     path('api-product/<str:slug>/', views.ProductDetailView.as_view(), name='api-product-detail'),
+    path('api-reserve/<str:slug>/', views.ReserveStockView.as_view(), name='api-product-reserve'),
+    path('api-live/<str:slug>/', views.ProductLiveView.as_view(), name='api-product-live'),
     path('api-comments/<str:slug>/', views.ProductCommentsView.as_view(), name='api-product-comments'),
+    path('api-recommendations/<str:slug>/', views.ProductRecommendationsView.as_view(),
+         name='api-product-recommendations'),
+    path('api-similar/<str:slug>/', views.ProductRecommendationsView.as_view(kind=ProductRecommendation.SIMILAR),
+         name='api-similar-products'),
+    path('api-author-products/<str:username>/', views.AuthorProductListView.as_view(),
+         name='api-author-products'),
+    path('api-author-stats/<str:username>/', views.AuthorStatisticsView.as_view(), name='api-author-stats'),
     path('api-cart/', views.CartView.as_view(), name='api-cart-view'),
 ]
\ No newline at end of file
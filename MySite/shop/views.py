@@ -1,27 +1,92 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework.generics import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import AllowAny, IsAuthenticated
 
-from .models import Product, Comment, Cart
-from .serializers import ProductSerializer, CommentSerializer, CartSerializer, FindProductToCartSerializer
-from .services import update_product_rating, get_cart, add_to_cart, remove_from_cart
+from MySite.throttles import IPTokenBucketThrottle, UserTokenBucketThrottle
+from MySite.routers import start_replica_reads, stop_replica_reads, mark_recent_write, has_recent_write
+from .conditional import not_modified_response, set_validators
+from .fragments import FragmentListResponse, product_fragments
+from .live import authenticate_stream, product_event_stream
+from .pagination import ApproximateCountPagination, KeysetPagination
+from .models import Product, Comment, ProductRecommendation
+from .serializers import (
+    ProductSerializer,
+    CommentSerializer,
+    CartSerializer,
+    FindProductToCartSerializer,
+    ProductRecommendationSerializer,
+    ReserveStockSerializer
+)
+from .services import (
+    record_product_view_service,
+    author_statistics_service,
+    reserve_stock_service,
+    reset_stock_counter_service,
+    cart_validators_service,
+    get_cart,
+    add_to_cart,
+    remove_from_cart,
+    read_guest_cart,
+    write_guest_cart,
+    guest_cart_data,
+    add_to_guest_cart,
+    remove_from_guest_cart
+)
 
 
-class ProductListCreateView(APIView):
+class ReplicaReadMixin:
+    """Serve GET requests from read replicas after authentication.
+
+    A successful write pins the user to the primary for a short window,
+    so they always read their own changes.
+    """
+
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method == 'GET' and not has_recent_write(request.user):
+            self._replica_token = start_replica_reads()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            stop_replica_reads(self._replica_token)
+            self._replica_token = None
+        elif (request.user.is_authenticated and request.method not in ('GET', 'HEAD', 'OPTIONS')
+              and response.status_code < 400):
+            mark_recent_write(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ProductListCreateView(ReplicaReadMixin, APIView):
     """View for listing and creating products."""
 
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        """Retrieve a list of all products."""
-        paginator = PageNumberPagination()
-        products = Product.objects.all()
+        """Retrieve a list of all products, most viewed first with ?ordering=popular.
+
+        Products are served from the encoded fragment cache, so only changed
+        products are serialized again. ``?fields=`` limits the returned fields
+        and the loaded columns.
+        """
+        fields = ProductSerializer.parse_fields(request.GET.get('fields'))
+        paginator = ApproximateCountPagination()
+        products = Product.objects.only('id', 'version')
+        if request.GET.get('ordering') == 'popular':
+            products = products.order_by('-view_count', '-id')
         paginated_products = paginator.paginate_queryset(products, request)
-        serializer = ProductSerializer(paginated_products, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        envelope = {
+            'count': paginator.page.paginator.count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        }
+        return FragmentListResponse(envelope, product_fragments(paginated_products, fields))
 
     def post(self, request):
         """Create a new product."""
@@ -36,17 +101,40 @@ class ProductListCreateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProductDetailView(APIView):
+class AuthorProductListView(ReplicaReadMixin, APIView):
+    """View for listing the products of one author."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, username):
+        """Retrieve the author's products, newest first, page by page."""
+        paginator = KeysetPagination()
+        products = Product.objects.select_related('author').filter(author__username=username)
+        paginated_products = paginator.paginate_queryset(products, request, view=self)
+        serializer = ProductSerializer(paginated_products, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ProductDetailView(ReplicaReadMixin, APIView):
     """View for retrieving and updating a specific product."""
 
     permission_classes = [IsAuthenticated]
 
     def get(self, request, slug):
-        """Retrieve a product by its slug."""
-        product = get_object_or_404(Product, slug=slug)
-        update_product_rating(product)
-        serializer = ProductSerializer(product)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        """Retrieve a product by its slug, or 304 if the client's copy is current.
+
+        ``?fields=`` limits the returned fields and the loaded columns.
+        """
+        fields = ProductSerializer.parse_fields(request.GET.get('fields'))
+        products = ProductSerializer.select_columns(Product.objects.all(), fields, 'version', 'updated_at')
+        product = get_object_or_404(products, slug=slug)
+        record_product_view_service(product, request.user)
+        etag = f'product-{product.pk}-{product.version}'
+        not_modified = not_modified_response(request, etag, product.updated_at)
+        if not_modified is not None:
+            return not_modified
+        serializer = ProductSerializer(product, fields=fields)
+        return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, product.updated_at)
 
     def patch(self, request, slug):
         """Update a product by its slug."""
@@ -60,6 +148,8 @@ class ProductDetailView(APIView):
 
         if serializer.is_valid():
             serializer.save()
+            if product.hot_stock and 'stock' in serializer.validated_data:
+                reset_stock_counter_service(product.pk)
             data = {
                 "message": "Product updated successfully.",
                 "product": serializer.data
@@ -68,17 +158,63 @@ class ProductDetailView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProductCommentsView(APIView):
+class ProductLiveView(View):
+    """Stream new comments and rating changes of a product as server-sent events.
+
+    Served by the ASGI application; each open stream holds no thread or
+    database connection while it waits.
+    """
+
+    async def get(self, request, slug):
+        user = await sync_to_async(authenticate_stream)(request)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        product = await Product.objects.only('id').filter(slug=slug).afirst()
+        if product is None:
+            raise Http404
+        response = StreamingHttpResponse(product_event_stream(product.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ReserveStockView(ReplicaReadMixin, APIView):
+    """View for reserving units of a product."""
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, slug):
+        """Reserve the requested quantity of a product if it is in stock."""
+        product = get_object_or_404(Product.objects.only('pk', 'hot_stock'), slug=slug)
+        serializer = ReserveStockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
+        if not reserve_stock_service(product, quantity):
+            return Response({"detail": "Not enough stock."}, status=status.HTTP_409_CONFLICT)
+        return Response({"message": "Product reserved.", "quantity": quantity}, status=status.HTTP_200_OK)
+
+
+class ProductCommentsView(ReplicaReadMixin, APIView):
     """View for retrieving and creating comments for a product."""
 
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle, IPTokenBucketThrottle]
+    throttle_scopes = {'POST': 'comment'}
 
     def get(self, request, slug):
-        """Retrieve all comments for a specific product."""
-        product = get_object_or_404(Product, slug=slug)
-        comments = product.comments.all()
+        """Retrieve all comments for a specific product, or 304 if the client's copy is current."""
+        product = get_object_or_404(
+            Product.objects.only('pk', 'version', 'updated_at', 'comments_version', 'comments_updated_at'), slug=slug
+        )
+        # Every comment includes the product name, so product changes count too.
+        etag = f'comments-{product.pk}-{product.comments_version}-{product.version}'
+        last_modified = max(product.updated_at, product.comments_updated_at)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        comments = product.comments.select_related('author', 'product')
         serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, last_modified)
 
     def post(self, request, slug):
         """Create a new comment for a specific product."""
@@ -95,20 +231,65 @@ class ProductCommentsView(APIView):
             return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class CartView(APIView):
-    """API view for managing user cart."""
+class ProductRecommendationsView(ReplicaReadMixin, APIView):
+    """View for precomputed recommendations of a product."""
+
+    permission_classes = [IsAuthenticated]
+    kind = ProductRecommendation.CART
+
+    def get(self, request, slug):
+        """Retrieve the top recommendations for a product in one query."""
+        recommendations = (
+            ProductRecommendation.objects
+            .filter(product__slug=slug, kind=self.kind)
+            .select_related('recommended')
+            .order_by('rank')
+        )
+        serializer = ProductRecommendationSerializer(recommendations, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AuthorStatisticsView(ReplicaReadMixin, APIView):
+    """View for aggregate statistics of an author's products."""
 
     permission_classes = [IsAuthenticated]
 
+    def get(self, request, username):
+        """Retrieve product, rating and review statistics of an author."""
+        data = author_statistics_service(username)
+        if data is None:
+            return Response({"detail": "Author not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class CartView(ReplicaReadMixin, APIView):
+    """API view for managing user cart.
+
+    Anonymous visitors get a guest cart kept in a signed cookie, which is
+    merged into their persistent cart when they log in or register.
+    """
+
+    permission_classes = [AllowAny]
+
     def get(self, request):
         """Retrieve the user's cart data."""
+        if not request.user.is_authenticated:
+            return Response(guest_cart_data(read_guest_cart(request)))
+        validators = cart_validators_service(request.user)
+        if validators is None:
+            return Response(get_cart(request))
+        not_modified = not_modified_response(request, *validators)
+        if not_modified is not None:
+            return not_modified
         data = get_cart(request)
-        return Response(data)
+        return set_validators(Response(data), *validators)
 
     def post(self, request):
         """Add a product to the user's cart."""
         serializer = FindProductToCartSerializer(data=request.data)
         if serializer.is_valid():
+            if not request.user.is_authenticated:
+                return self.guest_cart_response(add_to_guest_cart(request, serializer))
             data = add_to_cart(request, serializer)
             return Response(data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -117,6 +298,14 @@ class CartView(APIView):
         """Remove a product from the user's cart."""
         serializer = FindProductToCartSerializer(data=request.data)
         if serializer.is_valid():
+            if not request.user.is_authenticated:
+                return self.guest_cart_response(remove_from_guest_cart(request, serializer))
             data = remove_from_cart(request, serializer)
             return Response(data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_404_NOT_FOUND)
+
+    @staticmethod
+    def guest_cart_response(items):
+        response = Response(guest_cart_data(items), status=status.HTTP_200_OK)
+        write_guest_cart(response, items)
+        return response